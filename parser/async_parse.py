@@ -0,0 +1,170 @@
+import asyncio
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
+from typing import Iterator
+
+from parser.compact import CompactExam, load_compact_exam
+from parser.dataset.exam import Exam
+from parser.text_extraction import (
+    DEFAULT_EXTRACTOR,
+    PageTextExtractor,
+    PdfSource,
+    get_extractor,
+)
+
+# Parsing is CPU bound and runs on an executor so it never blocks the event loop. The
+# default executor of the loop is a thread pool, where parses share the GIL with the
+# loop. Pass a ProcessPoolExecutor to parse exams in parallel.
+
+
+class ParseError(Exception):
+    """
+    Base of the errors raised by parse_exam.
+    """
+
+
+class InvalidPdfError(ParseError):
+    """
+    The text of the pdf could not be extracted.
+    """
+
+
+class ExamStructureError(ParseError):
+    """
+    The pdf was read, but its pages, sections or questions could not be found.
+    """
+
+
+class ParseTimeoutError(ParseError, TimeoutError):
+    pass
+
+
+class ParseCancelledError(ParseError):
+    # raised in the worker thread of a cancelled parse to stop it early
+    pass
+
+
+class SourceExtractor(PageTextExtractor):
+    """
+    Extracts the pages of a given pdf, whatever path is asked for, raising
+    InvalidPdfError when the extractor fails and stopping between pages once
+    cancelled is set.
+    """
+
+    def __init__(
+        self,
+        extractor: PageTextExtractor,
+        source: PdfSource,
+        exam_name: str,
+        cancelled: threading.Event | None,
+    ):
+        self.extractor = extractor
+        self.source = source
+        self.exam_name = exam_name
+        self.cancelled = cancelled
+        self.name = extractor.name
+        self.strips_headers = extractor.strips_headers
+        self.marks_questions = extractor.marks_questions
+
+    def library_version(self) -> str:
+        return self.extractor.library_version()
+
+    def extract_pages(self, pdf: PdfSource) -> Iterator[str]:
+        pages = self.extractor.extract_pages(self.source)
+        while True:
+            if self.cancelled is not None and self.cancelled.is_set():
+                raise ParseCancelledError("Parsing was cancelled")
+            try:
+                text = next(pages)
+            except StopIteration:
+                return
+            except Exception as e:
+                raise InvalidPdfError(
+                    f"{self.exam_name}: {type(e).__name__}: {e}"
+                ) from e
+            yield text
+
+
+def parse_exam_sync(
+    source: PdfSource,
+    name: str,
+    extractor: str | PageTextExtractor = DEFAULT_EXTRACTOR,
+    compact: bool = False,
+    cancelled: threading.Event | None = None,
+) -> Exam | CompactExam:
+    """
+    Parses an exam from its path or contents, raising a ParseError on failure.
+
+    Args:
+    source (PdfSource): The path of the exam pdf, or its contents.
+    name (str): The exam_path given to the parsed exam.
+    extractor (str | PageTextExtractor): The page text extractor to use.
+    compact (bool): Whether to parse into a CompactExam.
+    cancelled (threading.Event | None): Stops the parse between pages once set.
+
+    Returns:
+    Exam | CompactExam: The parsed exam.
+    """
+    source_extractor = SourceExtractor(
+        get_extractor(extractor), source, name, cancelled
+    )
+    try:
+        if compact:
+            return load_compact_exam(name, source_extractor)
+        exam = Exam(name, None)
+        exam.load_data(extractor=source_extractor)
+        return exam
+    except ParseError:
+        raise
+    except Exception as e:
+        # the messages of the exceptions chained to a ParseError are lost when it is
+        # sent back from a worker process, so they are kept in its own
+        raise ExamStructureError(f"{name}: {type(e).__name__}: {e}") from e
+
+
+async def parse_exam(
+    source: PdfSource,
+    name: str | None = None,
+    executor: Executor | None = None,
+    extractor: str | PageTextExtractor = DEFAULT_EXTRACTOR,
+    compact: bool = False,
+    timeout: float | None = None,
+) -> Exam | CompactExam:
+    """
+    Parses an exam on an executor without blocking the event loop.
+
+    If the parse is cancelled or times out, a parse running on a thread stops at the
+    next page, and one running in a worker process finishes in the background.
+
+    Args:
+    source (PdfSource): The path of the exam pdf, or its contents.
+    name (str | None): The exam_path given to the parsed exam, the path of the pdf
+    by default.
+    executor (Executor | None): Where the exam is parsed, the default executor of
+    the loop if None.
+    extractor (str | PageTextExtractor): The page text extractor to use.
+    compact (bool): Whether to parse into a CompactExam.
+    timeout (float | None): Seconds after which ParseTimeoutError is raised.
+
+    Returns:
+    Exam | CompactExam: The parsed exam.
+    """
+    if name is None:
+        name = source if isinstance(source, str) else "<bytes>"
+
+    # events can't be sent to worker processes
+    cancelled = None if isinstance(executor, ProcessPoolExecutor) else threading.Event()
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(
+        executor,
+        partial(parse_exam_sync, source, name, extractor, compact, cancelled),
+    )
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except TimeoutError as e:
+        raise ParseTimeoutError(f"{name}: not parsed within {timeout}s") from e
+    finally:
+        # stops the parse if it is still running, the future is already cancelled
+        if cancelled is not None:
+            cancelled.set()
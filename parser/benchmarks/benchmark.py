@@ -0,0 +1,254 @@
+import argparse
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+from pydantic import BaseModel
+
+from parser.benchmarks.synthetic import SyntheticExtractor, generate_pages
+from parser.dataset.exam import Exam, read_pages
+from parser.featurization.input_type_extraction import featurize_exams
+from parser.page_processing import extract_section_info
+from parser.question_extraction import (
+    apply_header_filter,
+    extract_questions,
+    extract_sub_questions,
+    get_section_text,
+)
+from parser.section_processing import get_sections
+
+DEFAULT_SIZES = [10, 100, 1000, 4000]
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.2
+
+
+class BenchmarkResult(BaseModel, strict=True):
+    stage: str
+    # number of pages of the generated exam
+    pages: int
+    # length of the text the stage processes
+    text_bytes: int
+    # best wall time of the repeats
+    seconds: float
+    pages_per_second: float
+    bytes_per_second: float
+    # peak memory allocated by python while running the stage once
+    peak_memory_bytes: int
+
+
+class BenchmarkReport(BaseModel, strict=True):
+    python_version: str
+    seed: int
+    results: List[BenchmarkResult]
+
+
+# Each stage prepares its input from the generated pages and returns the function to
+# time along with the length of the text it processes.
+
+
+def prepare_apply_header_filter(pages: List[str]) -> Tuple[Callable[[], None], int]:
+    def run():
+        for page in pages:
+            apply_header_filter(page)
+
+    return run, sum(len(page) for page in pages)
+
+
+def prepare_extract_section_info(pages: List[str]) -> Tuple[Callable[[], None], int]:
+    section_pages = [page for page in pages if page.startswith("Computer Science")]
+
+    def run():
+        for page in section_pages:
+            extract_section_info(page)
+
+    return run, sum(len(page) for page in section_pages)
+
+
+def prepare_extract_questions(pages: List[str]) -> Tuple[Callable[[], None], int]:
+    _, _, classified_pages = read_pages(pages)
+    sections = [
+        (section.type, get_section_text(section)[0])
+        for section in get_sections(classified_pages)
+    ]
+
+    def run():
+        for section_type, text in sections:
+            extract_questions(text, section_type)
+
+    return run, sum(len(text) for _, text in sections)
+
+
+def prepare_extract_sub_questions(pages: List[str]) -> Tuple[Callable[[], None], int]:
+    _, _, classified_pages = read_pages(pages)
+    texts = [
+        question.original_text
+        for section in get_sections(classified_pages)
+        for question in extract_questions(get_section_text(section)[0], section.type)
+    ]
+
+    def run():
+        for text in texts:
+            extract_sub_questions(text)
+
+    return run, sum(len(text) for text in texts)
+
+
+def prepare_load_data(pages: List[str]) -> Tuple[Callable[[], None], int]:
+    extractor = SyntheticExtractor(pages)
+
+    def run():
+        Exam("synthetic.pdf", None).load_data(extractor=extractor)
+
+    return run, sum(len(page) for page in pages)
+
+
+def prepare_featurize_exams(pages: List[str]) -> Tuple[Callable[[], None], int]:
+    exam = Exam("synthetic.pdf", None)
+    exam.load_data(extractor=SyntheticExtractor(pages))
+
+    def run():
+        featurize_exams([exam])
+
+    return run, sum(len(page) for page in pages)
+
+
+STAGES: Dict[str, Callable[[List[str]], Tuple[Callable[[], None], int]]] = {
+    "apply_header_filter": prepare_apply_header_filter,
+    "extract_section_info": prepare_extract_section_info,
+    "extract_questions": prepare_extract_questions,
+    "extract_sub_questions": prepare_extract_sub_questions,
+    "load_data": prepare_load_data,
+    "featurize_exams": prepare_featurize_exams,
+}
+
+
+def run_benchmarks(
+    sizes: List[int] = DEFAULT_SIZES,
+    stages: List[str] = list(STAGES),
+    repeat: int = DEFAULT_REPEAT,
+    seed: int = 0,
+) -> BenchmarkReport:
+    """
+    Times each stage on generated exams of each size.
+
+    Args:
+    sizes (List[int]): Number of pages of each generated exam.
+    stages (List[str]): Names of the stages to run, from STAGES.
+    repeat (int): Number of timed runs of each stage, the fastest is kept.
+    seed (int): Seed of the generated exams.
+
+    Returns:
+    BenchmarkReport: The result of each stage at each size.
+    """
+    results: List[BenchmarkResult] = []
+    for num_pages in sizes:
+        pages = generate_pages(num_pages, seed)
+        for stage in stages:
+            run, text_bytes = STAGES[stage](pages)
+
+            seconds = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                run()
+                seconds = min(seconds, time.perf_counter() - start)
+
+            # measured in a separate run, tracing allocations slows the stage down
+            tracemalloc.start()
+            run()
+            _, peak_memory_bytes = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            print(f"{stage} on {num_pages} pages: {seconds:.4f}s", file=sys.stderr)
+            results.append(
+                BenchmarkResult(
+                    stage=stage,
+                    pages=num_pages,
+                    text_bytes=text_bytes,
+                    seconds=seconds,
+                    pages_per_second=num_pages / seconds if seconds > 0 else 0.0,
+                    bytes_per_second=text_bytes / seconds if seconds > 0 else 0.0,
+                    peak_memory_bytes=peak_memory_bytes,
+                )
+            )
+
+    return BenchmarkReport(
+        python_version=platform.python_version(), seed=seed, results=results
+    )
+
+
+def compare_reports(
+    report: BenchmarkReport,
+    baseline: BenchmarkReport,
+    threshold: float = DEFAULT_THRESHOLD,
+) -> List[str]:
+    """
+    Finds the stages that got slower than the baseline, on the same number of pages.
+
+    Args:
+    report (BenchmarkReport): The new results.
+    baseline (BenchmarkReport): The saved results to compare against.
+    threshold (float): Relative slowdown above which a stage is flagged, 0.2 flags
+    stages taking more than 120% of their baseline time.
+
+    Returns:
+    List[str]: A description of each slowdown.
+    """
+    baseline_results = {
+        (result.stage, result.pages): result for result in baseline.results
+    }
+    slowdowns: List[str] = []
+    for result in report.results:
+        baseline_result = baseline_results.get((result.stage, result.pages))
+        if baseline_result is None:
+            continue
+        if result.seconds > baseline_result.seconds * (1 + threshold):
+            slowdowns.append(
+                f"{result.stage} on {result.pages} pages: {result.seconds:.4f}s, "
+                f"baseline {baseline_result.seconds:.4f}s "
+                f"({result.seconds / baseline_result.seconds:.2f}x)"
+            )
+    return slowdowns
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Benchmark the extraction stages on generated FE exam text."
+    )
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    arg_parser.add_argument(
+        "--stages", choices=list(STAGES), nargs="+", default=list(STAGES)
+    )
+    arg_parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument(
+        "--output", help="write the results as json to this file instead of stdout"
+    )
+    arg_parser.add_argument(
+        "--baseline",
+        help="results of a previous run, exits with 1 if a stage got slower than it",
+    )
+    arg_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="relative slowdown against the baseline that is flagged",
+    )
+    args = arg_parser.parse_args()
+
+    report = run_benchmarks(args.sizes, args.stages, args.repeat, args.seed)
+
+    if args.output is None:
+        print(report.model_dump_json(indent=2))
+    else:
+        with open(args.output, "w") as output_file:
+            output_file.write(report.model_dump_json(indent=2))
+
+    if args.baseline is not None:
+        with open(args.baseline, "r") as baseline_file:
+            baseline = BenchmarkReport.model_validate_json(baseline_file.read())
+        slowdowns = compare_reports(report, baseline, args.threshold)
+        for slowdown in slowdowns:
+            print(f"Slower than baseline: {slowdown}", file=sys.stderr)
+        sys.exit(1 if len(slowdowns) > 0 else 0)
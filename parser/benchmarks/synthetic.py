@@ -0,0 +1,133 @@
+import random
+from typing import Iterator, List
+
+from parser.text_extraction import PageTextExtractor, PdfSource
+
+# Generates page text shaped like the pypdf output of FE exams, so the extraction can
+# be benchmarked at any size without the exam pdfs.
+
+SECTIONS = [
+    ("A", "BASIC DATA STRUCTURES", "DSN"),
+    ("B", "ADVANCED DATA STRUCTURES", "DSN"),
+    ("A", "ALGORITHM ANALYSIS", "ANL"),
+    ("B", "ALGORITHMS", "ALG"),
+]
+SUB_CATEGORIES = [
+    "Dynamic Memory Management in C",
+    "Linked Lists",
+    "Stacks",
+    "Binary Trees",
+    "Hash Tables",
+    "Recurrence Relations",
+    "Sorting",
+    "Bitwise Operators",
+]
+SENTENCES = [
+    "Consider the following struct and function:",
+    "What is the run time of the function below, in terms of n?",
+    "Show the state of the data structure after each operation.",
+    "Write a recursive function that returns the sum of the nodes.",
+    "Assume that all the memory allocations succeed.",
+    "Justify your answer using a recurrence relation.",
+]
+CODE = [
+    "typedef struct node {",
+    "  int data;",
+    "  struct node* next;",
+    "} node;",
+    "int f(node* ptr) {",
+    "  if (ptr == NULL) return 0;",
+    "  return ptr->data + f(ptr->next);",
+    "}",
+]
+# number of question pages following each section page
+PAGES_PER_SECTION = 3
+SEMESTER = "Summer"
+YEAR = 2021
+
+
+def generate_question(rng: random.Random, number: int, category: str) -> str:
+    lines: List[str] = [
+        f"{number}) ({rng.choice([5, 10, 15])} pts) {category} "
+        f"({rng.choice(SUB_CATEGORIES)})"
+    ]
+    lines.extend(rng.sample(SENTENCES, 2))
+    lines.extend(CODE[: rng.randint(2, len(CODE))])
+
+    style = rng.randint(0, 2)
+    if style == 0:
+        for label in "abc"[: rng.randint(2, 3)]:
+            lines.append(f"({label}) ({rng.randint(1, 5)} pts) {rng.choice(SENTENCES)}")
+            lines.append("Answer: _________________")
+    elif style == 1:
+        lines.extend(
+            f"int {name} = ___________;"
+            for name in rng.sample("xyzw", rng.randint(2, 4))
+        )
+    else:
+        lines.append("void solve(node* head) {")
+        lines.extend([""] * 8)
+        lines.append("}")
+    return "\n".join(lines)
+
+
+def generate_pages(num_pages: int, seed: int = 0) -> List[str]:
+    """
+    Generates the text of an exam with num_pages pages, made of a section page
+    followed by PAGES_PER_SECTION question pages, repeated.
+
+    Args:
+    num_pages (int): The number of pages to generate.
+    seed (int): Seed of the generated questions, the same seed gives the same text.
+
+    Returns:
+    List[str]: The text of each page.
+    """
+    rng = random.Random(seed)
+    pages: List[str] = []
+    section_index = -1
+    while len(pages) < num_pages:
+        section_index += 1
+        letter, name, category = SECTIONS[section_index % len(SECTIONS)]
+        pages.append(
+            "Computer Science Foundation Exam\n"
+            f"May 22, {YEAR}\n"
+            f"Section {letter}\n"
+            f"{name}\n"
+            "NO books, notes, or calculators may be used,\n"
+            "and you must work entirely on your own.\n"
+            "Question # Max Pts Category Score"
+        )
+        for question_number in range(1, PAGES_PER_SECTION + 1):
+            if len(pages) == num_pages:
+                break
+            pages.append(
+                f"{SEMESTER} {YEAR} Section {letter}: {name.title()}\n"
+                f"{generate_question(rng, question_number, category)}\n"
+                f"Page {len(pages) + 1} of {num_pages}"
+            )
+    return pages
+
+
+class SyntheticExtractor(PageTextExtractor):
+    """
+    Returns generated pages in place of the text of a pdf, so the whole of
+    Exam.load_data can run on them.
+    """
+
+    name = "synthetic"
+
+    def __init__(self, pages: List[str]):
+        self.pages = pages
+
+    def library_version(self) -> str:
+        return "0"
+
+    def extract_pages(self, pdf: PdfSource) -> Iterator[str]:
+        yield from self.pages
+
+    def count_pages(self, pdf: PdfSource) -> int:
+        return len(self.pages)
+
+    def extract_page_range(self, pdf: PdfSource, start: int, end: int) -> Iterator[str]:
+        yield from self.pages[start:end]
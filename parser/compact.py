@@ -0,0 +1,309 @@
+import json
+from typing import Any, Dict, Iterator, List, TextIO
+
+from parser.dataset.exam import DEFAULT_PAGE_WORKERS, Exam, RecordType
+from parser.dataset.page_cache import PageCache
+from parser.model import (
+    Metadata,
+    Question,
+    QuestionClassification,
+    Section,
+    SectionType,
+    SubQuestion,
+    Text,
+    TextLocation,
+)
+from parser.profiling import ExamProfile, count_sections, stage
+from parser.question_extraction import (
+    SubQuestionSpan,
+    get_page_numbers,
+    get_section_text,
+    get_segment_pages,
+    remove_sub_question_texts,
+    scan_sub_questions,
+    segment_questions,
+)
+from parser.section_processing import get_sections
+from parser.text_extraction import DEFAULT_EXTRACTOR, PageTextExtractor, get_extractor
+
+# A compact exam keeps a single copy of the text of each section. Questions and
+# sub-questions only store their location in it and materialize their text when it is
+# accessed, and the pages are dropped once the questions are extracted. The classes
+# mirror the attributes of the models they stand in for and can be converted to them.
+
+
+class CompactSubQuestion:
+    __slots__ = (
+        "_text",
+        "_span",
+        "_base",
+        "sub_questions",
+        "classification",
+        "solution",
+    )
+
+    def __init__(self, text: str, span: SubQuestionSpan, base: int):
+        self._text = text
+        self._span = span
+        # offset in text of the text the locations of the sub-question are relative to
+        self._base = base
+        self.sub_questions: List[CompactSubQuestion] = [
+            CompactSubQuestion(text, sub_span, span.text_start)
+            for sub_span in span.sub_questions
+        ]
+        self.classification: QuestionClassification | None = None
+        self.solution: str | None = None
+
+    @property
+    def identifier(self) -> str:
+        return self._span.identifier
+
+    @property
+    def points(self) -> int | None:
+        return self._span.points
+
+    @property
+    def extracted_using_underscores(self) -> bool:
+        return self._span.extracted_using_underscores
+
+    @property
+    def location(self) -> TextLocation:
+        # location in the text of the section
+        return TextLocation(start_index=self._span.start, end_index=self._span.end)
+
+    @property
+    def original_text(self) -> Text:
+        text = self._text[self._span.start : self._span.end]
+        return Text.from_string(text, text, self._span.start - self._base)
+
+    @property
+    def filtered_text(self) -> Text:
+        filtered_text = self._text[self._span.text_start : self._span.text_end]
+        if len(self._span.sub_questions) > 0:
+            last_span = self._span.sub_questions[-1]
+            filtered_text = remove_sub_question_texts(
+                filtered_text, [self._text[last_span.start : last_span.end]]
+            )
+        return Text.from_string(
+            filtered_text, filtered_text, self._span.start - self._base
+        )
+
+    def to_model(self) -> SubQuestion:
+        return SubQuestion(
+            identifier=self.identifier,
+            points=self.points,
+            original_text=self.original_text,
+            filtered_text=self.filtered_text,
+            sub_questions=[
+                sub_question.to_model() for sub_question in self.sub_questions
+            ],
+            extracted_using_underscores=self.extracted_using_underscores,
+            classification=self.classification,
+            solution=self.solution,
+        )
+
+
+class CompactQuestion:
+    __slots__ = (
+        "_text",
+        "location",
+        "pages",
+        "section_type",
+        "question_number",
+        "max_points",
+        "category",
+        "sub_category",
+        "sub_questions",
+        "metadata",
+        "solution",
+    )
+
+    def __init__(
+        self,
+        text: str,
+        location: TextLocation,
+        sub_question_spans: List[SubQuestionSpan],
+        pages: List[int],
+        section_type: SectionType,
+        question_number: int,
+        max_points: int,
+        category: str,
+        sub_category: str,
+    ):
+        self._text = text
+        # location of the question text in the text of the section
+        self.location = location
+        self.pages = pages
+        self.section_type = section_type
+        self.question_number = question_number
+        self.max_points = max_points
+        self.category = category
+        self.sub_category = sub_category
+        self.sub_questions = [
+            CompactSubQuestion(text, span, location.start_index)
+            for span in sub_question_spans
+        ]
+        self.metadata = Metadata()
+        self.solution: str | None = None
+
+    @property
+    def original_text(self) -> str:
+        return self._text[self.location.start_index : self.location.end_index]
+
+    @property
+    def filtered_text(self) -> str:
+        return remove_sub_question_texts(
+            self.original_text,
+            [
+                self._text[sub_question._span.start : sub_question._span.end]
+                for sub_question in self.sub_questions
+            ],
+        )
+
+    def to_model(self) -> Question:
+        return Question(
+            pages=list(self.pages),
+            section_type=self.section_type,
+            question_number=self.question_number,
+            max_points=self.max_points,
+            category=self.category,
+            sub_category=self.sub_category,
+            original_text=self.original_text,
+            filtered_text=self.filtered_text,
+            sub_questions=[
+                sub_question.to_model() for sub_question in self.sub_questions
+            ],
+            metadata=self.metadata,
+            solution=self.solution,
+        )
+
+
+class CompactSection:
+    __slots__ = ("start_page", "end_page", "type", "text", "questions")
+
+    def __init__(
+        self, section: Section, filter_headers: bool = True, marked: bool = False
+    ):
+        self.start_page = section.start_page
+        self.end_page = section.end_page
+        self.type = section.type
+
+        # the header filtered text of the pages, shared by every question
+        self.text, page_offsets = get_section_text(section, filter_headers)
+        page_numbers = get_page_numbers(section)
+
+        questions: Dict[int, CompactQuestion] = {}
+        for segment in segment_questions(self.text, marked):
+            question_number, max_points, category, sub_category = (
+                segment.header.groups()
+            )
+            questions[int(question_number)] = CompactQuestion(
+                text=self.text,
+                location=TextLocation(start_index=segment.start, end_index=segment.end),
+                sub_question_spans=scan_sub_questions(
+                    self.text, segment.start, segment.end
+                ),
+                pages=get_segment_pages(page_numbers, page_offsets, segment),
+                section_type=section.type,
+                question_number=int(question_number),
+                max_points=int(max_points),
+                category=category,
+                sub_category=sub_category,
+            )
+        self.questions = sorted(questions.values(), key=lambda q: q.question_number)
+
+    def to_model(self) -> Section:
+        return Section(
+            start_page=self.start_page,
+            end_page=self.end_page,
+            type=self.type,
+            pages=[],
+            questions=[question.to_model() for question in self.questions],
+        )
+
+
+class CompactExam:
+    __slots__ = (
+        "loaded",
+        "exam_path",
+        "solutions_path",
+        "sections",
+        "semester",
+        "year",
+        "profile",
+    )
+
+    def __init__(
+        self,
+        exam_path: str,
+        semester: str,
+        year: int,
+        sections: List[CompactSection],
+    ):
+        self.loaded = True
+        self.exam_path = exam_path
+        self.solutions_path: str | None = None
+        self.semester = semester
+        self.year = year
+        self.sections = sections
+        # set when the exam was parsed with profiling enabled
+        self.profile: ExamProfile | None = None
+
+    def to_model(self) -> Exam:
+        exam = Exam(self.exam_path, self.solutions_path)
+        exam.semester = self.semester
+        exam.year = self.year
+        exam.sections = [section.to_model() for section in self.sections]
+        exam.loaded = True
+        return exam
+
+    def iter_records(
+        self, record_type: RecordType = RecordType.QUESTION
+    ) -> Iterator[Dict[str, Any]]:
+        exam_fields = {
+            "exam_path": self.exam_path,
+            "semester": self.semester,
+            "year": self.year,
+        }
+        for section in self.sections:
+            if record_type == RecordType.SECTION:
+                yield exam_fields | section.to_model().model_dump(
+                    mode="json", exclude={"pages"}
+                )
+                continue
+            for question in section.questions:
+                yield exam_fields | question.to_model().model_dump(mode="json")
+
+    def write_jsonl(
+        self, stream: TextIO, record_type: RecordType = RecordType.QUESTION
+    ):
+        for record in self.iter_records(record_type):
+            stream.write(json.dumps(record) + "\n")
+        stream.flush()
+
+    def write(self, output_file: str):
+        self.to_model().write(output_file, include_pages=False)
+
+
+def load_compact_exam(
+    exam_path: str,
+    extractor: str | PageTextExtractor = DEFAULT_EXTRACTOR,
+    cache: PageCache | None = None,
+    page_workers: int = DEFAULT_PAGE_WORKERS,
+) -> CompactExam:
+    exam = Exam(exam_path, None)
+    pages = exam.load_pages(extractor, cache, page_workers)
+    with stage("get_sections"):
+        sections = get_sections(pages)
+    with stage("get_questions"):
+        extractor = get_extractor(extractor)
+        compact_sections = [
+            CompactSection(
+                section, not extractor.strips_headers, extractor.marks_questions
+            )
+            for section in sections
+        ]
+    count_sections(compact_sections)
+    assert exam.semester is not None
+    assert exam.year is not None
+    return CompactExam(exam_path, exam.semester, exam.year, compact_sections)
@@ -0,0 +1,461 @@
+import argparse
+import mmap
+import os
+import struct
+import time
+from typing import Dict, Iterable, List
+
+import numpy as np
+from pydantic import BaseModel
+
+from parser.compact import CompactExam
+from parser.dataset.exam import Exam
+from parser.model import Metadata, Question, Section, SectionType, SubQuestion
+
+# A corpus store packs the questions of many parsed exams in one file. The fields of
+# the questions and sections that have a fixed width are stored as columns, one array
+# per field, and their texts in a single utf-8 blob the columns point into. The
+# sub-questions, metadata and solution of each question, which have no fixed shape, are
+# stored in the blob as a json record.
+#
+# The file is memory-mapped and read-only, and the columns are numpy arrays over the
+# mapping, so opening a store only reads its index, processes opening the same store
+# share its pages through the page cache, and queries over the columns never build a
+# Question. A Question is only built, from its columns, texts and record, when it is
+# accessed. Unlike a snapshot, a store holds no pages.
+#
+# Layout: header, index, then aligned to COLUMN_ALIGNMENT the columns of the sections,
+# the page numbers of the questions, the columns of the questions and the text blob.
+
+CORPUS_MAGIC = b"FECORP"
+CORPUS_VERSION = 1
+# magic, version, length of the index
+header_struct = struct.Struct("<6sHQ")
+COLUMN_ALIGNMENT = 8
+
+# rows of a section column or of a question column are sections or questions, in the
+# order of their exams, and the _start and _end columns are ranges of rows of another
+# column or of bytes of the blob
+SECTION_COLUMNS: Dict[str, np.dtype] = {
+    "exam": np.dtype("<i4"),
+    # index in SECTION_TYPES
+    "type": np.dtype("<i1"),
+    "start_page": np.dtype("<i4"),
+    "end_page": np.dtype("<i4"),
+    "questions_start": np.dtype("<i8"),
+    "questions_end": np.dtype("<i8"),
+}
+QUESTION_COLUMNS: Dict[str, np.dtype] = {
+    "exam": np.dtype("<i4"),
+    "section": np.dtype("<i4"),
+    "question_number": np.dtype("<i4"),
+    "max_points": np.dtype("<i4"),
+    # index in the strings of the index
+    "category": np.dtype("<i4"),
+    "sub_category": np.dtype("<i4"),
+    "pages_start": np.dtype("<i8"),
+    "pages_end": np.dtype("<i8"),
+    "original_text_start": np.dtype("<i8"),
+    "original_text_end": np.dtype("<i8"),
+    "filtered_text_start": np.dtype("<i8"),
+    "filtered_text_end": np.dtype("<i8"),
+    "record_start": np.dtype("<i8"),
+    "record_end": np.dtype("<i8"),
+}
+PAGE_DTYPE = np.dtype("<i4")
+SECTION_TYPES = list(SectionType)
+
+
+class CorpusExam(BaseModel, strict=True):
+    exam_path: str
+    solutions_path: str | None
+    semester: str | None
+    year: int | None
+    # rows of its sections
+    sections_start: int
+    sections_end: int
+
+
+class CorpusIndex(BaseModel, strict=True):
+    exams: List[CorpusExam]
+    # categories and sub-categories
+    strings: List[str]
+    section_count: int
+    question_count: int
+    page_count: int
+    # offset of each column and of the blob, relative to the aligned end of the index
+    offsets: Dict[str, int]
+    blob_length: int
+
+
+class QuestionRecord(BaseModel, strict=True):
+    # the fields of a Question stored in the blob
+    sub_questions: List[SubQuestion]
+    metadata: Metadata
+    solution: str | None = None
+
+
+def align(offset: int) -> int:
+    return -(-offset // COLUMN_ALIGNMENT) * COLUMN_ALIGNMENT
+
+
+def write_corpus(exams: Iterable[Exam | CompactExam], corpus_path: str) -> int:
+    """
+    Writes the questions of exams to a corpus store, replacing it atomically.
+
+    Args:
+    exams (Iterable[Exam | CompactExam]): The loaded exams.
+    corpus_path (str): The file to write.
+
+    Returns:
+    int: The size of the store in bytes.
+    """
+    corpus_exams: List[CorpusExam] = []
+    string_ids: Dict[str, int] = {}
+    sections: Dict[str, List[int]] = {name: [] for name in SECTION_COLUMNS}
+    questions: Dict[str, List[int]] = {name: [] for name in QUESTION_COLUMNS}
+    pages: List[int] = []
+    blob: List[bytes] = []
+    blob_length = 0
+
+    def add_to_blob(data: str) -> int:
+        nonlocal blob_length
+        blob.append(data.encode())
+        blob_length += len(blob[-1])
+        return blob_length
+
+    for exam in exams:
+        if isinstance(exam, CompactExam):
+            exam = exam.to_model()
+        assert exam.loaded
+        exam_id = len(corpus_exams)
+        sections_start = len(sections["exam"])
+        for section in exam.sections or []:
+            section_id = len(sections["exam"])
+            sections["exam"].append(exam_id)
+            sections["type"].append(SECTION_TYPES.index(section.type))
+            sections["start_page"].append(section.start_page)
+            sections["end_page"].append(section.end_page)
+            sections["questions_start"].append(len(questions["exam"]))
+            for question in section.questions or []:
+                questions["exam"].append(exam_id)
+                questions["section"].append(section_id)
+                questions["question_number"].append(question.question_number)
+                questions["max_points"].append(question.max_points)
+                questions["category"].append(
+                    string_ids.setdefault(question.category, len(string_ids))
+                )
+                questions["sub_category"].append(
+                    string_ids.setdefault(question.sub_category, len(string_ids))
+                )
+                questions["pages_start"].append(len(pages))
+                pages.extend(question.pages)
+                questions["pages_end"].append(len(pages))
+                questions["original_text_start"].append(blob_length)
+                questions["original_text_end"].append(
+                    add_to_blob(question.original_text)
+                )
+                questions["filtered_text_start"].append(blob_length)
+                questions["filtered_text_end"].append(
+                    add_to_blob(question.filtered_text)
+                )
+                record = QuestionRecord(
+                    sub_questions=question.sub_questions,
+                    metadata=question.metadata,
+                    solution=question.solution,
+                )
+                questions["record_start"].append(blob_length)
+                questions["record_end"].append(add_to_blob(record.model_dump_json()))
+            sections["questions_end"].append(len(questions["exam"]))
+        corpus_exams.append(
+            CorpusExam(
+                exam_path=exam.exam_path,
+                solutions_path=exam.solutions_path,
+                semester=exam.semester,
+                year=exam.year,
+                sections_start=sections_start,
+                sections_end=len(sections["exam"]),
+            )
+        )
+
+    columns: Dict[str, bytes] = {}
+    for name, dtype in SECTION_COLUMNS.items():
+        columns[f"section_{name}"] = np.array(sections[name], dtype=dtype).tobytes()
+    columns["pages"] = np.array(pages, dtype=PAGE_DTYPE).tobytes()
+    for name, dtype in QUESTION_COLUMNS.items():
+        columns[f"question_{name}"] = np.array(questions[name], dtype=dtype).tobytes()
+    offsets: Dict[str, int] = {}
+    offset = 0
+    for name, column in columns.items():
+        offsets[name] = offset
+        offset = align(offset + len(column))
+    offsets["blob"] = offset
+
+    index = (
+        CorpusIndex(
+            exams=corpus_exams,
+            strings=list(string_ids),
+            section_count=len(sections["exam"]),
+            question_count=len(questions["exam"]),
+            page_count=len(pages),
+            offsets=offsets,
+            blob_length=blob_length,
+        )
+        .model_dump_json()
+        .encode()
+    )
+    index_end = header_struct.size + len(index)
+
+    temp_path = f"{corpus_path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as corpus_file:
+        corpus_file.write(header_struct.pack(CORPUS_MAGIC, CORPUS_VERSION, len(index)))
+        corpus_file.write(index)
+        corpus_file.write(bytes(align(index_end) - index_end))
+        for name, column in columns.items():
+            corpus_file.write(column)
+            corpus_file.write(bytes(align(len(column)) - len(column)))
+        corpus_file.writelines(blob)
+    os.replace(temp_path, corpus_path)
+    return align(index_end) + offset + blob_length
+
+
+class CorpusStore:
+    """
+    Read-only access to the questions of a corpus store written by write_corpus.
+    Questions are identified by their row, in the order of their exams.
+
+    The columns in sections, questions and pages are views of the mapped file. A
+    column still referenced once the store is closed keeps the file mapped until it is
+    garbage collected.
+    """
+
+    def __init__(self, corpus_path: str):
+        self.corpus_path = corpus_path
+        with open(corpus_path, "rb") as corpus_file:
+            if os.fstat(corpus_file.fileno()).st_size < header_struct.size:
+                raise ValueError(f"{corpus_path} is not a corpus store")
+            # the mapping stays valid once the file is closed
+            self.data = mmap.mmap(corpus_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, index_length = header_struct.unpack_from(self.data)
+        if magic != CORPUS_MAGIC:
+            self.data.close()
+            raise ValueError(f"{corpus_path} is not a corpus store")
+        if version != CORPUS_VERSION:
+            self.data.close()
+            raise ValueError(
+                f"{corpus_path} has version {version}, expected {CORPUS_VERSION}"
+            )
+        index_end = header_struct.size + index_length
+        self.index = CorpusIndex.model_validate_json(
+            self.data[header_struct.size : index_end]
+        )
+        self.exams_by_path: Dict[str, int] = {
+            exam.exam_path: exam_id for exam_id, exam in enumerate(self.index.exams)
+        }
+        self.string_ids: Dict[str, int] = {
+            string: string_id for string_id, string in enumerate(self.index.strings)
+        }
+
+        data_start = align(index_end)
+        offsets = self.index.offsets
+
+        def column(name: str, dtype: np.dtype, count: int) -> np.ndarray:
+            return np.frombuffer(
+                self.data, dtype=dtype, count=count, offset=data_start + offsets[name]
+            )
+
+        self.sections: Dict[str, np.ndarray] = {
+            name: column(f"section_{name}", dtype, self.index.section_count)
+            for name, dtype in SECTION_COLUMNS.items()
+        }
+        self.pages = column("pages", PAGE_DTYPE, self.index.page_count)
+        self.questions: Dict[str, np.ndarray] = {
+            name: column(f"question_{name}", dtype, self.index.question_count)
+            for name, dtype in QUESTION_COLUMNS.items()
+        }
+        self.blob_start = data_start + offsets["blob"]
+
+    def __len__(self) -> int:
+        return self.index.question_count
+
+    def get_text(self, start: int, end: int) -> str:
+        return self.data[self.blob_start + start : self.blob_start + end].decode()
+
+    def get_question(self, row: int) -> Question:
+        """
+        Builds the question of a row from the store.
+        """
+        columns = self.questions
+        record = QuestionRecord.model_validate_json(
+            self.data[
+                self.blob_start + int(columns["record_start"][row]) : self.blob_start
+                + int(columns["record_end"][row])
+            ]
+        )
+        strings = self.index.strings
+        return Question(
+            pages=self.pages[
+                columns["pages_start"][row] : columns["pages_end"][row]
+            ].tolist(),
+            section_type=SECTION_TYPES[self.sections["type"][columns["section"][row]]],
+            question_number=int(columns["question_number"][row]),
+            max_points=int(columns["max_points"][row]),
+            category=strings[columns["category"][row]],
+            sub_category=strings[columns["sub_category"][row]],
+            original_text=self.get_text(
+                int(columns["original_text_start"][row]),
+                int(columns["original_text_end"][row]),
+            ),
+            filtered_text=self.get_text(
+                int(columns["filtered_text_start"][row]),
+                int(columns["filtered_text_end"][row]),
+            ),
+            sub_questions=record.sub_questions,
+            metadata=record.metadata,
+            solution=record.solution,
+        )
+
+    def get_exam(self, row: int) -> CorpusExam:
+        # the exam of the question of a row
+        return self.index.exams[self.questions["exam"][row]]
+
+    def query(
+        self,
+        section_type: SectionType | None = None,
+        category: str | None = None,
+        sub_category: str | None = None,
+        max_points: int | None = None,
+        semester: str | None = None,
+        year: int | None = None,
+    ) -> List[int]:
+        """
+        Finds the questions matching every given filter from the columns alone,
+        without building any question.
+
+        Returns:
+        List[int]: The rows of the matching questions, in order.
+        """
+        matches = np.ones(self.index.question_count, dtype=bool)
+        columns = self.questions
+        if section_type is not None:
+            section_types = self.sections["type"][columns["section"]]
+            matches &= section_types == SECTION_TYPES.index(section_type)
+        for name, value in (("category", category), ("sub_category", sub_category)):
+            if value is None:
+                continue
+            if value not in self.string_ids:
+                return []
+            matches &= columns[name] == self.string_ids[value]
+        if max_points is not None:
+            matches &= columns["max_points"] == max_points
+        if semester is not None or year is not None:
+            exam_matches = np.array(
+                [
+                    (semester is None or exam.semester == semester)
+                    and (year is None or exam.year == year)
+                    for exam in self.index.exams
+                ],
+                dtype=bool,
+            )
+            matches &= exam_matches[columns["exam"]]
+        return np.flatnonzero(matches).tolist()
+
+    def read_exam(self, exam_path: str) -> Exam:
+        """
+        Builds an exam, without its pages, and all of its questions from the store.
+        """
+        corpus_exam = self.index.exams[self.exams_by_path[exam_path]]
+        exam = Exam(corpus_exam.exam_path, corpus_exam.solutions_path)
+        exam.semester = corpus_exam.semester
+        exam.year = corpus_exam.year
+        exam.sections = []
+        for section_row in range(corpus_exam.sections_start, corpus_exam.sections_end):
+            exam.sections.append(
+                Section(
+                    start_page=int(self.sections["start_page"][section_row]),
+                    end_page=int(self.sections["end_page"][section_row]),
+                    type=SECTION_TYPES[self.sections["type"][section_row]],
+                    questions=[
+                        self.get_question(row)
+                        for row in range(
+                            self.sections["questions_start"][section_row],
+                            self.sections["questions_end"][section_row],
+                        )
+                    ],
+                )
+            )
+        exam.loaded = True
+        return exam
+
+    def close(self):
+        # the arrays over the mapping must be released before it can be closed
+        self.sections = {}
+        self.questions = {}
+        self.pages = np.empty(0, dtype=PAGE_DTYPE)
+        try:
+            self.data.close()
+        except BufferError:
+            # a column is still referenced elsewhere, the file is unmapped once the
+            # last view of it is garbage collected
+            pass
+
+    def __enter__(self) -> "CorpusStore":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Write and query corpus stores of parsed exams."
+    )
+    sub_parsers = arg_parser.add_subparsers(dest="command", required=True)
+    write_parser = sub_parsers.add_parser(
+        "write", help="write the exams of _extracted.json files to a corpus store"
+    )
+    write_parser.add_argument("corpus_path")
+    write_parser.add_argument("inputs", nargs="+")
+    query_parser = sub_parsers.add_parser(
+        "query", help="print the questions matching every given filter"
+    )
+    query_parser.add_argument("corpus_path")
+    query_parser.add_argument("--section-type", choices=list(SectionType))
+    query_parser.add_argument("--category")
+    query_parser.add_argument("--sub-category")
+    query_parser.add_argument("--max-points", type=int)
+    query_parser.add_argument("--semester")
+    query_parser.add_argument("--year", type=int)
+    args = arg_parser.parse_args()
+
+    if args.command == "write":
+        size = write_corpus(
+            [Exam.read(input_file) for input_file in args.inputs], args.corpus_path
+        )
+        print(f"Wrote {len(args.inputs)} exams to {args.corpus_path}, {size} bytes")
+    elif args.command == "query":
+        start = time.perf_counter()
+        with CorpusStore(args.corpus_path) as store:
+            open_seconds = time.perf_counter() - start
+            rows = store.query(
+                SectionType(args.section_type) if args.section_type else None,
+                args.category,
+                args.sub_category,
+                args.max_points,
+                args.semester,
+                args.year,
+            )
+            for row in rows:
+                corpus_exam = store.get_exam(row)
+                question = store.get_question(row)
+                print(
+                    f"{corpus_exam.exam_path} {question.section_type} "
+                    f"Q{question.question_number} {question.category} "
+                    f"{question.sub_category} ({question.max_points} pts)"
+                )
+        seconds = time.perf_counter() - start
+        print(
+            f"Opened in {open_seconds:.4f}s, found {len(rows)} questions in "
+            f"{seconds:.4f}s"
+        )
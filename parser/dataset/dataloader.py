@@ -1,42 +1,497 @@
 import os
-from typing import List
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Dict, Iterator, List, Set, Tuple
 
-from parser.dataset.exam import Exam
-from parser.model import Semester
+from pydantic import BaseModel
+
+from parser.compact import CompactExam, load_compact_exam
+from parser.dataset.corpus_store import write_corpus
+from parser.dataset.exam import DEFAULT_PAGE_WORKERS, Exam, read_exam_date
+from parser.dataset.manifest import get_parser_version, read_manifest
+from parser.dataset.page_cache import PageCache, hash_file
+from parser.dataset.question_index import ExamIndex, QuestionReference
+from parser.dataset.search_index import (
+    DEFAULT_SEARCH_LIMIT,
+    SearchIndex,
+    SearchResult,
+)
+from parser.dataset.snapshot import Snapshot, write_snapshot
+from parser.dataset.solutions import get_solutions_path, try_load_solutions
+from parser.model import QuestionInputType, SectionType, Semester
+from parser.profiling import ExamProfile, ProfileReport, profile_exam, stage
+from parser.text_extraction import DEFAULT_EXTRACTOR
+
+DEFAULT_MAX_LOADED_EXAMS = 8
+
+
+class ExamFailure(BaseModel, strict=True):
+    exam_path: str
+    error: str
+    profile: ExamProfile | None = None
 
 
 class DataLoader:
-    exams: List[Exam]
+    exams: List[Exam | CompactExam]
+    failures: List[ExamFailure]
+    index: ExamIndex
+    # path of each exam by semester and year, in lazy mode
+    catalog: Dict[Tuple[str, int], str]
+    # parsed exams by semester and year, least recently used first, in lazy mode
+    loaded_exams: OrderedDict[Tuple[str, int], Exam | CompactExam]
+    snapshot: Snapshot | None
+    search_index: SearchIndex | None
+    # exams indexed since the search index was read, in lazy mode
+    indexed_paths: Set[str]
     loaded: bool
 
-    def __init__(self, data_dir: str, solutions_dir: str):
+    def __init__(
+        self,
+        data_dir: str,
+        solutions_dir: str | None,
+        workers: int = 1,
+        extractor: str = DEFAULT_EXTRACTOR,
+        cache: PageCache | None = None,
+        compact: bool = False,
+        profile: bool = False,
+        manifest_path: str | None = None,
+        lazy: bool = False,
+        max_loaded_exams: int = DEFAULT_MAX_LOADED_EXAMS,
+        snapshot_path: str | None = None,
+        search_index_path: str | None = None,
+    ):
         self.exam_dir = data_dir
+        # solutions pdfs named after the exam pdfs, parsed along with the exams and
+        # aligned to their questions, see parser.dataset.solutions
         self.solutions_dir = solutions_dir
+        # number of processes used to parse exams, 1 parses them in this process
+        self.workers = workers
+        self.extractor = extractor
+        self.cache = cache
+        # keep CompactExams, which share one copy of the text of each section
+        self.compact = compact
+        # time the stages of parsing each exam
+        self.profile = profile
+        # only parse the exams that changed since the outputs recorded in the manifest
+        self.manifest_path = manifest_path
+        # only read the date of each exam in load_data and parse an exam when it is
+        # first accessed, keeping at most max_loaded_exams of them parsed
+        self.lazy = lazy
+        self.max_loaded_exams = max_loaded_exams
+        # read the exams from this snapshot instead of parsing the pdfs
+        self.snapshot_path = snapshot_path
+        self.snapshot = None
+        # keep a full-text search index of the parsed exams in this file
+        self.search_index_path = search_index_path
+        self.search_index = None
         self.loaded = False
 
-    def load_data(self):
+    def load_data(self) -> ProfileReport | None:
+        """
+        Parses every exam of the data directory, or in lazy mode only reads their dates.
+        With a snapshot, the exams are read from it instead, see load_snapshot.
+
+        The solutions pdf of each exam in the solutions directory, if any, is parsed
+        with the exam and its solutions attached to the questions.
+
+        With a manifest, exams whose pdfs and parser version match the manifest are
+        read from their extracted json instead, as Exams even if compact, and the
+        manifest is updated with the exams that were parsed.
+
+        With a search index, the exams that were parsed or are not indexed yet are
+        indexed, and the exams that are no longer loaded are removed from it. In lazy
+        mode, the exams that are no longer in the data directory are removed from it,
+        and each exam is indexed when get_exam first parses it.
+
+        Returns:
+        ProfileReport | None: The stage timings and counters of each exam, or None if
+        profiling is disabled.
+        """
         self.exams = []
-        for filename in os.listdir(self.exam_dir):
-            if filename.endswith(".pdf"):
-                exam_path = os.path.join(self.exam_dir, filename)
-                # solutions_path = os.path.join(
-                #    self.solutions_dir, filename.replace(".pdf", "_solutions.pdf")
-                # )
-                exam = Exam(exam_path, None)
-                exam.load_data()
-                output_file = (
-                    os.path.dirname(exam_path)
-                    + "/"
-                    + os.path.basename(exam_path).removesuffix(".pdf")
-                    + "_extracted.json"
+        self.failures = []
+        if self.snapshot_path is not None:
+            self.load_snapshot(self.snapshot_path)
+            return None
+        if self.lazy:
+            self.load_catalog()
+            return None
+
+        report = ProfileReport() if self.profile else None
+        exam_paths = get_exam_paths(self.exam_dir)
+
+        manifest = read_manifest(self.manifest_path) if self.manifest_path else None
+        version = get_parser_version(self.extractor, self.compact)
+        source_hashes: Dict[str, str] = {}
+        unchanged_exams: Dict[str, Exam] = {}
+        if manifest is not None:
+            for exam_path in exam_paths:
+                source_hashes[exam_path] = get_source_hash(
+                    exam_path, get_solutions_path(self.solutions_dir, exam_path)
                 )
-                exam.write(output_file)
-                self.exams.append(exam)
+                if not manifest.is_up_to_date(
+                    exam_path, source_hashes[exam_path], version
+                ):
+                    continue
+                try:
+                    unchanged_exams[exam_path] = Exam.read(
+                        manifest.entries[exam_path].output_path
+                    )
+                except (OSError, ValueError) as e:
+                    print(f"Parsing {exam_path} again, could not read its output: {e}")
+
+        results = ingest_exams(
+            [path for path in exam_paths if path not in unchanged_exams],
+            self.workers,
+            self.extractor,
+            self.cache,
+            compact=self.compact,
+            profile=self.profile,
+            solutions_dir=self.solutions_dir,
+        )
+        for exam_path in exam_paths:
+            if exam_path in unchanged_exams:
+                self.exams.append(unchanged_exams[exam_path])
+                continue
+
+            result = next(results)
+            if isinstance(result, ExamFailure):
+                self.failures.append(result)
+            else:
+                self.exams.append(result)
+                if manifest is not None:
+                    manifest.record(
+                        exam_path,
+                        source_hashes[exam_path],
+                        version,
+                        get_output_path(exam_path),
+                    )
+            if report is not None and result.profile is not None:
+                report.exams.append(result.profile)
+
+        if manifest is not None and self.manifest_path is not None:
+            # forget the exams that were removed from the data directory
+            manifest.entries = {
+                exam_path: entry
+                for exam_path, entry in manifest.entries.items()
+                if exam_path in source_hashes
+            }
+            manifest.write(self.manifest_path)
+
+        self.index = ExamIndex(self.exams)
+        if self.search_index_path is not None:
+            self.update_search_index(
+                self.search_index_path,
+                {path for path in exam_paths if path not in unchanged_exams},
+            )
         self.loaded = True
-        pass
+        return report
 
-    def get_exam(self, semester: Semester, year: int) -> Exam | None:
+    def update_search_index(self, search_index_path: str, parsed_paths: Set[str]):
+        search_index = SearchIndex.read(search_index_path)
+        loaded_paths = {exam.exam_path for exam in self.exams}
+        for exam_path in list(search_index.documents_by_exam):
+            if exam_path not in loaded_paths:
+                search_index.remove_exam(exam_path)
         for exam in self.exams:
-            if exam.semester == semester and exam.year == year:
-                return exam
-        return None
+            if (
+                exam.exam_path in parsed_paths
+                or exam.exam_path not in search_index.documents_by_exam
+            ):
+                search_index.add_exam(exam)
+        search_index.write(search_index_path)
+        self.search_index = search_index
+
+    def load_search_index(self, search_index_path: str):
+        """
+        Reads the search index in lazy mode, removing the exams that are not in the
+        catalog. The exams are indexed as get_exam parses them, see index_exam.
+        """
+        search_index = SearchIndex.read(search_index_path)
+        catalog_paths = set(self.catalog.values())
+        for exam_path in list(search_index.documents_by_exam):
+            if exam_path not in catalog_paths:
+                search_index.remove_exam(exam_path)
+        search_index.write(search_index_path)
+        self.search_index = search_index
+        self.indexed_paths = set()
+
+    def index_exam(self, exam: Exam | CompactExam):
+        # in lazy mode, an exam is indexed again the first time it is parsed, in case
+        # its pdf changed, and the index is written after each exam
+        if self.search_index is None or exam.exam_path in self.indexed_paths:
+            return
+        assert self.search_index_path is not None
+        self.search_index.add_exam(exam)
+        self.search_index.write(self.search_index_path)
+        self.indexed_paths.add(exam.exam_path)
+
+    def load_snapshot(self, snapshot_path: str):
+        """
+        Reads every exam of a snapshot, or in lazy mode only its index, in which case
+        each exam is read from the snapshot when it is first accessed.
+
+        With a search index, the exams of the snapshot that are not indexed yet are
+        indexed, or all of them if the snapshot was written after the index.
+        """
+        self.snapshot = Snapshot(snapshot_path)
+        if self.lazy:
+            self.catalog = {}
+            self.loaded_exams = OrderedDict()
+            for entry in self.snapshot.entries:
+                if entry.semester is not None and entry.year is not None:
+                    self.catalog.setdefault(
+                        (entry.semester, entry.year), entry.exam_path
+                    )
+            if self.search_index_path is not None:
+                self.load_search_index(self.search_index_path)
+        else:
+            self.exams = list(self.snapshot.read_exams())
+            self.index = ExamIndex(self.exams)
+            index_path = self.search_index_path
+            if index_path is not None:
+                # the snapshot may hold other parses of the indexed exams
+                snapshot_is_newer = not os.path.isfile(index_path) or (
+                    os.path.getmtime(snapshot_path) > os.path.getmtime(index_path)
+                )
+                self.update_search_index(
+                    index_path,
+                    {exam.exam_path for exam in self.exams}
+                    if snapshot_is_newer
+                    else set(),
+                )
+        self.loaded = True
+
+    def write_snapshot(self, snapshot_path: str, include_pages: bool = True) -> int:
+        assert self.loaded
+        assert not self.lazy, "only exams that are all parsed can be snapshotted"
+        return write_snapshot(self.exams, snapshot_path, include_pages)
+
+    def write_corpus(self, corpus_path: str) -> int:
+        assert self.loaded
+        assert not self.lazy, "only exams that are all parsed can be stored"
+        return write_corpus(self.exams, corpus_path)
+
+    def load_catalog(self):
+        self.catalog = {}
+        self.loaded_exams = OrderedDict()
+        for exam_path in get_exam_paths(self.exam_dir):
+            try:
+                date = read_exam_date(exam_path, self.extractor)
+            except Exception as e:
+                self.failures.append(
+                    ExamFailure(exam_path=exam_path, error=f"{type(e).__name__}: {e}")
+                )
+                continue
+            self.catalog.setdefault(date, exam_path)
+        if self.search_index_path is not None:
+            self.load_search_index(self.search_index_path)
+        self.loaded = True
+
+    def get_exam(self, semester: Semester, year: int) -> Exam | CompactExam | None:
+        assert self.loaded
+        if not self.lazy:
+            return self.index.get_exam(semester, year)
+
+        date = (semester, year)
+        exam = self.loaded_exams.get(date)
+        if exam is not None:
+            self.loaded_exams.move_to_end(date)
+            return exam
+
+        exam_path = self.catalog.get(date)
+        if exam_path is None:
+            return None
+        result: Exam | CompactExam | ExamFailure
+        if self.snapshot is not None:
+            try:
+                result = self.snapshot.read_exam(exam_path)
+            except Exception as e:
+                result = ExamFailure(
+                    exam_path=exam_path, error=f"{type(e).__name__}: {e}"
+                )
+        else:
+            result = ingest_exam(
+                exam_path,
+                self.extractor,
+                self.cache,
+                write_output=False,
+                compact=self.compact,
+                solutions_dir=self.solutions_dir,
+            )
+        if isinstance(result, ExamFailure):
+            # recorded once, later calls return None without parsing it again
+            del self.catalog[date]
+            self.failures.append(result)
+            return None
+
+        self.index_exam(result)
+        self.loaded_exams[date] = result
+        while len(self.loaded_exams) > self.max_loaded_exams:
+            self.loaded_exams.popitem(last=False)
+        return result
+
+    def query_questions(
+        self,
+        section_type: SectionType | None = None,
+        category: str | None = None,
+        sub_category: str | None = None,
+        max_points: int | None = None,
+        input_type: QuestionInputType | None = None,
+        semester: Semester | None = None,
+        year: int | None = None,
+    ) -> List[QuestionReference]:
+        """
+        Finds the loaded questions matching every given filter, see ExamIndex.query.
+        Input types are those classified by the enrichment, so call reindex after
+        enriching the exams.
+        """
+        assert self.loaded
+        assert not self.lazy, "questions can only be queried once every exam is parsed"
+        return self.index.query(
+            section_type, category, sub_category, max_points, input_type, semester, year
+        )
+
+    def reindex(self):
+        self.index = ExamIndex(self.exams)
+
+    def search_questions(
+        self,
+        query: str,
+        section_type: SectionType | None = None,
+        category: str | None = None,
+        limit: int = DEFAULT_SEARCH_LIMIT,
+    ) -> List[SearchResult]:
+        """
+        Ranks the questions and sub-questions matching the query, see
+        SearchIndex.search. In lazy mode, only the exams parsed so far, in this or
+        an earlier run, are searched.
+        """
+        assert self.loaded
+        assert self.search_index is not None, "no search_index_path was given"
+        return self.search_index.search(query, section_type, category, limit)
+
+
+def get_exam_paths(data_dir: str) -> List[str]:
+    return [
+        os.path.join(data_dir, filename)
+        for filename in sorted(os.listdir(data_dir))
+        if filename.endswith(".pdf")
+    ]
+
+
+def get_output_path(exam_path: str) -> str:
+    return (
+        os.path.dirname(exam_path)
+        + "/"
+        + os.path.basename(exam_path).removesuffix(".pdf")
+        + "_extracted.json"
+    )
+
+
+def get_source_hash(exam_path: str, solutions_path: str | None) -> str:
+    # the output also depends on the solutions pdf
+    source_hash = hash_file(exam_path)
+    if solutions_path is None:
+        return source_hash
+    return f"{source_hash}+{hash_file(solutions_path)}"
+
+
+def ingest_exam(
+    exam_path: str,
+    extractor: str = DEFAULT_EXTRACTOR,
+    cache: PageCache | None = None,
+    write_output: bool = True,
+    compact: bool = False,
+    profile: bool = False,
+    page_workers: int = DEFAULT_PAGE_WORKERS,
+    solutions_dir: str | None = None,
+) -> Exam | CompactExam | ExamFailure:
+    """
+    Parses a single exam, along with its solutions pdf if solutions_dir has one, and
+    if write_output, writes its extracted json next to the pdf. An exam whose solutions
+    can't be parsed is kept without them.
+
+    Errors are returned as an ExamFailure instead of being raised so that one bad
+    pdf does not abort a whole batch. If profile, the profile of the exam is set on
+    the result.
+    """
+    with profile_exam(exam_path, profile) as exam_profile:
+        try:
+            exam: Exam | CompactExam
+            if compact:
+                exam = load_compact_exam(exam_path, extractor, cache, page_workers)
+            else:
+                exam = Exam(exam_path, None)
+                exam.load_data(
+                    extractor=extractor, cache=cache, page_workers=page_workers
+                )
+            solutions_path = get_solutions_path(solutions_dir, exam_path)
+            if solutions_path is not None:
+                try_load_solutions(exam, solutions_path, extractor, cache, page_workers)
+            if write_output:
+                with stage("write"):
+                    exam.write(get_output_path(exam_path))
+            exam.profile = exam_profile
+            return exam
+        except Exception as e:
+            return ExamFailure(
+                exam_path=exam_path,
+                error=f"{type(e).__name__}: {e}",
+                profile=exam_profile,
+            )
+
+
+def ingest_exams(
+    exam_paths: List[str],
+    workers: int = 1,
+    extractor: str = DEFAULT_EXTRACTOR,
+    cache: PageCache | None = None,
+    write_output: bool = True,
+    compact: bool = False,
+    profile: bool = False,
+    solutions_dir: str | None = None,
+) -> Iterator[Exam | CompactExam | ExamFailure]:
+    """
+    Parses exams, yielding results in the same order as exam_paths.
+
+    Args:
+    exam_paths (List[str]): Paths of the exam pdfs to parse.
+    workers (int): Number of worker processes, 1 parses in the current process.
+    extractor (str): Name of the page text extractor to use.
+    cache (PageCache | None): Cache of the extracted pages, shared by the workers.
+    write_output (bool): Whether to write the extracted json of each exam.
+    compact (bool): Whether to parse into CompactExams, written without their pages.
+    profile (bool): Whether to set the stage timings and counters on each result.
+    solutions_dir (str | None): Directory of the solutions pdfs of the exams.
+
+    Returns:
+    Iterator[Exam | CompactExam | ExamFailure]: The parsed exam or the failure for
+    each path.
+    """
+    if workers <= 1 or len(exam_paths) <= 1:
+        for exam_path in exam_paths:
+            yield ingest_exam(
+                exam_path,
+                extractor,
+                cache,
+                write_output,
+                compact,
+                profile,
+                solutions_dir=solutions_dir,
+            )
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(exam_paths))) as executor:
+        yield from executor.map(
+            partial(
+                ingest_exam,
+                extractor=extractor,
+                cache=cache,
+                write_output=write_output,
+                compact=compact,
+                profile=profile,
+                solutions_dir=solutions_dir,
+            ),
+            exam_paths,
+        )
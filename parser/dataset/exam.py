@@ -1,13 +1,20 @@
+import itertools
+import json
+import math
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import List, Tuple
+from enum import StrEnum
+from functools import partial
+from typing import Any, Dict, Iterable, Iterator, List, TextIO, Tuple
 
-from pydantic import BaseModel
-from pypdf import PdfReader
+from pydantic import BaseModel, Field
 
+from parser.dataset.page_cache import CachedPages, PageCache
 from parser.model import (
     Page,
     PageType,
+    Question,
     Section,
     SectionType,
     Semester,
@@ -15,12 +22,47 @@ from parser.model import (
     sections_as_string,
 )
 from parser.page_processing import (
+    PAGE_CLASSIFIER,
+    PageClassification,
+    PageClassifier,
     extract_date_from_page,
-    get_page_type,
-    get_section_type,
+)
+from parser.profiling import (
+    ExamProfile,
+    count_pages,
+    count_regex_bytes,
+    count_sections,
+    stage,
+    time_iterator,
 )
 from parser.question_extraction import get_questions, write_to_file
 from parser.section_processing import get_sections
+from parser.streaming import stream_questions
+from parser.text_extraction import (
+    DEFAULT_EXTRACTOR,
+    PageTextExtractor,
+    PdfSource,
+    get_extractor,
+)
+
+DEFAULT_PAGE_WORKERS = 1
+
+
+class RecordType(StrEnum):
+    QUESTION = "question"
+    SECTION = "section"
+
+
+class ExamFile(BaseModel, strict=True):
+    # The fields written by Exam.write. Exam itself can't be validated from json as
+    # its __init__ only takes the paths of the exam.
+    loaded: bool
+    exam_path: str
+
+    solutions_path: str | None
+    sections: List[Section] | None
+    semester: str | None
+    year: int | None
 
 
 class Exam(BaseModel, strict=True):
@@ -31,6 +73,8 @@ class Exam(BaseModel, strict=True):
     sections: List[Section] | None
     semester: str | None
     year: int | None
+    # set when the exam was parsed with profiling enabled
+    profile: ExamProfile | None = Field(default=None, exclude=True)
 
     def __init__(self, exam_path: str, solutions_path: str | None = None):
         super().__init__(
@@ -42,59 +86,33 @@ class Exam(BaseModel, strict=True):
             year=None,
         )
 
-    def load_data(self, verbose: bool = False):
+    def load_data(
+        self,
+        verbose: bool = False,
+        extractor: str | PageTextExtractor = DEFAULT_EXTRACTOR,
+        cache: PageCache | None = None,
+        page_workers: int = DEFAULT_PAGE_WORKERS,
+        streaming: bool = False,
+    ):
+        """
+        Parses the exam. When streaming, the pages are split into questions as they
+        are read and are not kept, neither the cache nor the page workers are used,
+        and verbose writes only sections.txt.
+        """
         assert not self.loaded
-        try:
-            # Open and read the PDF file
-            reader = PdfReader(self.exam_path)
-
-            # Process the PDF content here
-            # For example, you could extract text from each page:
-            pages: List[Page] = []
-            previous_section_type: SectionType | None = None
-            for page_number, page in enumerate(reader.pages):
-                if previous_section_type is None:
-                    assert page_number == 0
-                    date = extract_date_from_page(page.extract_text())
-                    assert date is not None
-                    semester, year = get_semester_and_year(date)
-                    self.semester = semester
-                    self.year = year
-
-                text = page.extract_text()
-
-                page_type = get_page_type(text)
-                if page_type is None:
-                    print(
-                        f"Breaking on page {page_number} because it is not a valid PageType"
-                    )
-                    break
-
-                section_type: SectionType | None = None
-                if page_type == PageType.SECTION:
-                    section_type = get_section_type(text)
-                    if section_type is None:
-                        print(
-                            f"Breaking on page {
-                            page_number} because it is not a valid SectionType"
-                        )
-                        print(text)
-                        break
-                else:
-                    section_type = previous_section_type
-
-                if section_type is None:
-                    raise ValueError("section_type is None")
-
-                new_page = Page(
-                    page_type=page_type,
-                    section_type=section_type,
-                    page_number=page_number,
-                    text=text,
+        if streaming:
+            for _ in self.stream_questions(extractor):
+                pass
+            if verbose:
+                assert self.sections is not None
+                write_to_file(
+                    "sections.txt",
+                    "\n".join(sections_as_string(self.sections, include_metadata=True)),
                 )
-                pages.append(new_page)
+            return
 
-                previous_section_type = section_type
+        try:
+            pages = self.load_pages(extractor, cache, page_workers)
 
             if verbose:
                 write_to_file(
@@ -105,7 +123,8 @@ class Exam(BaseModel, strict=True):
                     "\n".join(pages_as_string(pages, include_metadata=True)),
                 )
 
-            sections: List[Section] = get_sections(pages)
+            with stage("get_sections"):
+                sections: List[Section] = get_sections(pages)
 
             if verbose:
                 write_to_file(
@@ -113,25 +132,355 @@ class Exam(BaseModel, strict=True):
                     "\n".join(sections_as_string(sections, include_metadata=True)),
                 )
 
-            for section in sections:
-                questions = get_questions(section)
-                section.questions = questions
+            with stage("get_questions"):
+                extractor = get_extractor(extractor)
+                for section in sections:
+                    questions = get_questions(
+                        section,
+                        not extractor.strips_headers,
+                        extractor.marks_questions,
+                    )
+                    section.questions = questions
 
             self.sections = sections
+            count_sections(sections)
 
             self.loaded = True
         except Exception as e:
-            print(f"An error occurred: {e}", file=sys.stderr)
-            import traceback
+            print(
+                f"An error occurred while loading {self.exam_path}: {e}",
+                file=sys.stderr,
+            )
+            raise
+
+    def stream_questions(
+        self,
+        extractor: str | PageTextExtractor = DEFAULT_EXTRACTOR,
+        keep_questions: bool = True,
+    ) -> Iterator[Question]:
+        """
+        Parses the exam, yielding each question as soon as its last page is read. At
+        most the pages of the question being read are held in memory. The exam is
+        loaded once every question is yielded, its sections without their pages.
+
+        Args:
+        extractor (str | PageTextExtractor): The page text extractor to use.
+        keep_questions (bool): Whether the sections of the exam hold their
+        questions once loaded.
+
+        Returns:
+        Iterator[Question]: The questions, in the order they appear in the exam.
+        """
+        assert not self.loaded
+        extractor = get_extractor(extractor)
+        resolver = PageResolver()
+        sections: List[Section] = []
+        try:
+            pages = resolver.resolve(
+                classify_pages(
+                    time_iterator("decode", extractor.extract_pages(self.exam_path))
+                )
+            )
+            for item in stream_questions(
+                pages,
+                keep_questions,
+                not extractor.strips_headers,
+                extractor.marks_questions,
+            ):
+                if isinstance(item, Section):
+                    sections.append(item)
+                else:
+                    yield item
+
+            if resolver.semester is None or resolver.year is None:
+                raise ValueError("No pages found")
+        except Exception as e:
+            print(
+                f"An error occurred while loading {self.exam_path}: {e}",
+                file=sys.stderr,
+            )
+            raise
+
+        self.semester = resolver.semester
+        self.year = resolver.year
+        self.sections = sections
+        count_pages(resolver.page_count)
+        count_sections(sections)
+        self.loaded = True
+
+    def load_pages(
+        self,
+        extractor: str | PageTextExtractor = DEFAULT_EXTRACTOR,
+        cache: PageCache | None = None,
+        page_workers: int = DEFAULT_PAGE_WORKERS,
+    ) -> List[Page]:
+        """
+        Extracts and classifies the pages of the exam, from the cache when possible,
+        and sets the semester and year of the exam. With more than one page worker,
+        the pages are extracted and classified on that many processes.
+        """
+        extractor = get_extractor(extractor)
+
+        cache_key: str | None = None
+        cached_pages: CachedPages | None = None
+        if cache is not None:
+            with stage("page_cache"):
+                cache_key = cache.get_key(self.exam_path, extractor.version)
+                cached_pages = cache.get(cache_key)
+
+        if cached_pages is None:
+            if page_workers > 1:
+                semester, year, pages = read_pages_parallel(
+                    self.exam_path, extractor, page_workers
+                )
+            else:
+                semester, year, pages = read_pages(
+                    time_iterator("decode", extractor.extract_pages(self.exam_path))
+                )
+            if cache is not None:
+                assert cache_key is not None
+                with stage("page_cache"):
+                    cache.put(
+                        cache_key,
+                        CachedPages(semester=semester, year=year, pages=pages),
+                    )
+        else:
+            semester = cached_pages.semester
+            year = cached_pages.year
+            pages = cached_pages.pages
+
+        self.semester = semester
+        self.year = year
+        count_pages(len(pages))
 
-            traceback.print_exc()
-            sys.exit(1)
+        return pages
 
-    def write(self, output_file: str):
+    @classmethod
+    def read(cls, input_file: str) -> "Exam":
+        """
+        Reads an exam written by Exam.write.
+        """
+        with open(input_file, "r") as json_file:
+            return cls.from_json(json_file.read())
+
+    @classmethod
+    def from_json(cls, json_data: str | bytes) -> "Exam":
+        exam_file = ExamFile.model_validate_json(json_data)
+        exam = cls(exam_file.exam_path, exam_file.solutions_path)
+        exam.sections = exam_file.sections
+        exam.semester = exam_file.semester
+        exam.year = exam_file.year
+        exam.loaded = exam_file.loaded
+        return exam
+
+    def write(self, output_file: str, include_pages: bool = True):
         assert self.loaded
         print(f"Writing to {output_file}")
         with open(output_file, "w") as json_file:
-            json_file.write(self.model_dump_json())
+            if include_pages:
+                json_file.write(self.model_dump_json())
+            else:
+                json_file.write(
+                    self.model_dump_json(exclude={"sections": {"__all__": {"pages"}}})
+                )
+
+    def iter_records(
+        self, record_type: RecordType = RecordType.QUESTION
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yields one json serializable record per question or section of the exam, each
+        tagged with the exam it comes from.
+        """
+        assert self.loaded
+        assert self.sections is not None
+        exam_fields = {
+            "exam_path": self.exam_path,
+            "semester": self.semester,
+            "year": self.year,
+        }
+        for section in self.sections:
+            if record_type == RecordType.SECTION:
+                yield exam_fields | section.model_dump(mode="json")
+                continue
+            for question in section.questions or []:
+                yield exam_fields | question.model_dump(mode="json")
+
+    def write_jsonl(
+        self, stream: TextIO, record_type: RecordType = RecordType.QUESTION
+    ):
+        for record in self.iter_records(record_type):
+            stream.write(json.dumps(record) + "\n")
+        stream.flush()
+
+
+def read_pages(
+    page_texts: Iterable[str], classifier: PageClassifier = PAGE_CLASSIFIER
+) -> Tuple[Semester, int, List[Page]]:
+    """
+    Classifies the extracted text of each page of an exam.
+
+    Args:
+    page_texts (Iterable[str]): The text of each page, in page order.
+    classifier (PageClassifier): The classifier of each page.
+
+    Returns:
+    Tuple[Semester, int, List[Page]]: The semester and year of the exam, and its pages
+    up to the first page that could not be classified.
+    """
+    return resolve_pages(classify_pages(page_texts, classifier))
+
+
+def read_pages_parallel(
+    pdf: PdfSource,
+    extractor: str | PageTextExtractor = DEFAULT_EXTRACTOR,
+    workers: int = DEFAULT_PAGE_WORKERS,
+    classifier: PageClassifier = PAGE_CLASSIFIER,
+) -> Tuple[Semester, int, List[Page]]:
+    """
+    Same as read_pages, but extracts and classifies the pages of the pdf on worker
+    processes, each reading a range of pages, before assigning them to sections in
+    page order.
+
+    Classifying a page does not depend on the pages before it, only assigning the
+    question pages to the section page before them does, which is left to the cheap
+    sequential pass.
+    """
+    extractor = get_extractor(extractor)
+    num_pages = extractor.count_pages(pdf)
+    # one range per worker, opening the pdf and finding the first page of a range
+    # costs about as much as extracting a hundred pages with pypdf
+    range_size = max(1, math.ceil(num_pages / workers))
+    starts = list(range(0, num_pages, range_size))
+    with stage("decode_and_classify"):
+        with ProcessPoolExecutor(
+            max_workers=max(1, min(workers, len(starts)))
+        ) as executor:
+            page_ranges = list(
+                executor.map(
+                    partial(
+                        classify_page_range,
+                        pdf,
+                        extractor,
+                        range_size=range_size,
+                        classifier=classifier,
+                    ),
+                    starts,
+                )
+            )
+
+    classified_pages = list(itertools.chain.from_iterable(page_ranges))
+    for text, _ in classified_pages:
+        count_regex_bytes(len(text))
+    return resolve_pages(classified_pages)
+
+
+def classify_page_range(
+    pdf: PdfSource,
+    extractor: PageTextExtractor,
+    start: int,
+    range_size: int,
+    classifier: PageClassifier = PAGE_CLASSIFIER,
+) -> List[Tuple[str, PageClassification]]:
+    return [
+        (text, classifier.classify(text, read_date=page_number == 0))
+        for page_number, text in enumerate(
+            extractor.extract_page_range(pdf, start, start + range_size), start
+        )
+    ]
+
+
+def classify_pages(
+    page_texts: Iterable[str], classifier: PageClassifier = PAGE_CLASSIFIER
+) -> Iterator[Tuple[str, PageClassification]]:
+    for page_number, text in enumerate(page_texts):
+        count_regex_bytes(len(text))
+        with stage("classify_pages"):
+            # the date is only read on the first page, which is a section page
+            classification = classifier.classify(text, read_date=page_number == 0)
+        yield text, classification
+
+
+def resolve_pages(
+    classified_pages: Iterable[Tuple[str, PageClassification]],
+) -> Tuple[Semester, int, List[Page]]:
+    resolver = PageResolver()
+    pages = list(resolver.resolve(classified_pages))
+    if resolver.semester is None or resolver.year is None:
+        raise ValueError("No pages found")
+
+    return resolver.semester, resolver.year, pages
+
+
+class PageResolver:
+    """
+    Assigns each question page to the section of the section page before it, one
+    page at a time, reading the semester and year of the exam from the first page.
+    """
+
+    def __init__(self):
+        self.semester: Semester | None = None
+        self.year: int | None = None
+        self.page_count = 0
+
+    def resolve(
+        self, classified_pages: Iterable[Tuple[str, PageClassification]]
+    ) -> Iterator[Page]:
+        previous_section_type: SectionType | None = None
+        for page_number, (text, classification) in enumerate(classified_pages):
+            if previous_section_type is None:
+                assert page_number == 0
+                date = classification.date
+                assert date is not None
+                self.semester, self.year = get_semester_and_year(date)
+
+            page_type = classification.page_type
+            if page_type is None:
+                print(
+                    f"Breaking on page {page_number} because it is not a valid PageType"
+                )
+                break
+
+            section_type: SectionType | None = None
+            if page_type == PageType.SECTION:
+                section_type = classification.section_type
+                if section_type is None:
+                    print(
+                        f"Breaking on page {
+                        page_number} because it is not a valid SectionType"
+                    )
+                    print(text)
+                    break
+            else:
+                section_type = previous_section_type
+
+            if section_type is None:
+                raise ValueError("section_type is None")
+
+            yield Page(
+                page_type=page_type,
+                section_type=section_type,
+                page_number=page_number,
+                text=text,
+            )
+            self.page_count += 1
+
+            previous_section_type = section_type
+
+
+def read_exam_date(
+    exam_path: str, extractor: str | PageTextExtractor = DEFAULT_EXTRACTOR
+) -> Tuple[Semester, int]:
+    """
+    Reads the semester and year of an exam from the date on its first page, without
+    extracting the other pages.
+    """
+    first_page = next(get_extractor(extractor).extract_pages(exam_path), None)
+    if first_page is None:
+        raise ValueError("No pages found")
+    date = extract_date_from_page(first_page)
+    if date is None:
+        raise ValueError("No date found on the first page")
+    return get_semester_and_year(date)
 
 
 def get_semester_and_year(date: datetime) -> Tuple[Semester, int]:
@@ -0,0 +1,68 @@
+import os
+import time
+from typing import Dict
+
+from pydantic import BaseModel
+
+from parser.text_extraction import DEFAULT_EXTRACTOR, PageTextExtractor, get_extractor
+
+# Bump whenever a change to the parser changes the extracted json, so that every exam
+# recorded in a manifest is parsed again.
+PARSER_VERSION = "2"
+
+
+class ManifestEntry(BaseModel, strict=True):
+    # sha256 of the exam pdf, followed by that of its solutions pdf if it has one
+    source_hash: str
+    parser_version: str
+    output_path: str
+    # unix time at which the output was written
+    timestamp: float
+
+
+class Manifest(BaseModel, strict=True):
+    # keyed by exam path
+    entries: Dict[str, ManifestEntry] = {}
+
+    def is_up_to_date(self, exam_path: str, source_hash: str, version: str) -> bool:
+        """
+        Returns whether the recorded output of the exam was produced from the same
+        pdfs by the same parser version, and still exists.
+        """
+        entry = self.entries.get(exam_path)
+        return (
+            entry is not None
+            and entry.source_hash == source_hash
+            and entry.parser_version == version
+            and os.path.exists(entry.output_path)
+        )
+
+    def record(self, exam_path: str, source_hash: str, version: str, output_path: str):
+        self.entries[exam_path] = ManifestEntry(
+            source_hash=source_hash,
+            parser_version=version,
+            output_path=output_path,
+            timestamp=time.time(),
+        )
+
+    def write(self, manifest_path: str):
+        temp_path = f"{manifest_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as manifest_file:
+            manifest_file.write(self.model_dump_json(indent=2))
+        os.replace(temp_path, manifest_path)
+
+
+def read_manifest(manifest_path: str) -> Manifest:
+    try:
+        with open(manifest_path, "r") as manifest_file:
+            return Manifest.model_validate_json(manifest_file.read())
+    except FileNotFoundError:
+        return Manifest()
+
+
+def get_parser_version(
+    extractor: str | PageTextExtractor = DEFAULT_EXTRACTOR, compact: bool = False
+) -> str:
+    # the output also depends on the extracted text, and compact outputs have no pages
+    version = f"{PARSER_VERSION}-{get_extractor(extractor).version}"
+    return f"{version}-compact" if compact else version
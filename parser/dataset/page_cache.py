@@ -0,0 +1,146 @@
+import argparse
+import hashlib
+import os
+from typing import List
+
+from pydantic import BaseModel
+
+from parser.model import Page, Semester
+from parser.page_processing import PAGE_CLASSIFIER_VERSION
+
+CACHE_FILE_SUFFIX = ".pages.json"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+class CachedPages(BaseModel, strict=True):
+    semester: Semester
+    year: int
+    pages: List[Page]
+
+
+def hash_file(path: str) -> str:
+    with open(path, "rb") as file:
+        return hashlib.file_digest(file, "sha256").hexdigest()
+
+
+class PageCache:
+    """
+    On-disk cache of the classified pages of each exam pdf.
+
+    Entries are keyed by the sha256 of the pdf contents, the version of the extractor
+    that produced the text and the version of the page classification, so editing a
+    pdf, upgrading the extractor or changing the classifier never returns stale
+    pages. Once the cache grows past max_bytes the least recently
+    used entries are evicted.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get_key(self, pdf_path: str, extractor_version: str) -> str:
+        return f"{hash_file(pdf_path)}.{extractor_version}.{PAGE_CLASSIFIER_VERSION}"
+
+    def get(self, key: str) -> CachedPages | None:
+        path = self._get_path(key)
+        try:
+            with open(path, "r") as cache_file:
+                cached_pages = CachedPages.model_validate_json(cache_file.read())
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            # written by an incompatible version of the models, parse the pdf again
+            self._remove(os.path.basename(path))
+            return None
+        # the modification time is used as the last access time for eviction
+        os.utime(path)
+        return cached_pages
+
+    def put(self, key: str, cached_pages: CachedPages):
+        path = self._get_path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as cache_file:
+            cache_file.write(cached_pages.model_dump_json())
+        os.replace(temp_path, path)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            if not filename.endswith(CACHE_FILE_SUFFIX):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, filename))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, filename))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, filename in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            self._remove(filename)
+            total_bytes -= size
+
+    def clear(self, pdf_path: str | None = None) -> int:
+        """
+        Removes cached entries.
+
+        Args:
+        pdf_path (str | None): Only remove the entries of this pdf, for every
+        extractor and classifier version. All entries are removed if None.
+
+        Returns:
+        int: The number of removed entries.
+        """
+        prefix = f"{hash_file(pdf_path)}." if pdf_path is not None else ""
+        removed = 0
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith(CACHE_FILE_SUFFIX) and filename.startswith(prefix):
+                self._remove(filename)
+                removed += 1
+        return removed
+
+    def size(self) -> int:
+        return sum(
+            os.path.getsize(os.path.join(self.cache_dir, filename))
+            for filename in os.listdir(self.cache_dir)
+            if filename.endswith(CACHE_FILE_SUFFIX)
+        )
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + CACHE_FILE_SUFFIX)
+
+    def _remove(self, filename: str):
+        try:
+            os.remove(os.path.join(self.cache_dir, filename))
+        except FileNotFoundError:
+            # already evicted by another process
+            pass
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Manage the page text cache.")
+    arg_parser.add_argument("cache_dir")
+    sub_parsers = arg_parser.add_subparsers(dest="command", required=True)
+    clear_parser = sub_parsers.add_parser(
+        "clear", help="invalidate cached pages, of every pdf unless --pdf is given"
+    )
+    clear_parser.add_argument("--pdf", action="append", default=[])
+    sub_parsers.add_parser("stats", help="print the number of entries and their size")
+    args = arg_parser.parse_args()
+
+    cache = PageCache(args.cache_dir)
+    if args.command == "clear":
+        if len(args.pdf) == 0:
+            print(f"Removed {cache.clear()} entries")
+        for pdf_path in args.pdf:
+            print(f"Removed {cache.clear(pdf_path)} entries for {pdf_path}")
+    elif args.command == "stats":
+        entries = [
+            filename
+            for filename in os.listdir(cache.cache_dir)
+            if filename.endswith(CACHE_FILE_SUFFIX)
+        ]
+        print(f"{len(entries)} entries, {cache.size()} bytes")
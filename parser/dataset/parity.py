@@ -0,0 +1,137 @@
+import argparse
+import sys
+from typing import List
+
+from pydantic import BaseModel
+
+from parser.dataset.exam import Exam
+from parser.model import Question
+from parser.text_extraction import EXTRACTORS, PyMuPDFExtractor, PypdfExtractor
+
+
+class PageTextDiff(BaseModel, strict=True):
+    page_number: int
+    baseline_text: str | None
+    candidate_text: str | None
+
+
+class QuestionDiff(BaseModel, strict=True):
+    # "<section type> <question number>"
+    question: str
+    baseline: Question | None
+    candidate: Question | None
+
+
+class ParityReport(BaseModel, strict=True):
+    exam_path: str
+    baseline: str
+    candidate: str
+    page_diffs: List[PageTextDiff]
+    question_diffs: List[QuestionDiff]
+
+    @property
+    def matches(self) -> bool:
+        return len(self.page_diffs) == 0 and len(self.question_diffs) == 0
+
+
+def check_extractor_parity(
+    exam_path: str,
+    baseline: str = PypdfExtractor.name,
+    candidate: str = PyMuPDFExtractor.name,
+) -> ParityReport:
+    """
+    Parses an exam with two extractors and compares the Page.text and the extracted
+    questions each of them produces.
+
+    Args:
+    exam_path (str): The exam pdf to parse.
+    baseline (str): Name of the extractor used as reference.
+    candidate (str): Name of the extractor being checked against the baseline.
+
+    Returns:
+    ParityReport: Every page and question that differs between the two extractors.
+    """
+    baseline_exam = Exam(exam_path, None)
+    baseline_exam.load_data(extractor=baseline)
+    candidate_exam = Exam(exam_path, None)
+    candidate_exam.load_data(extractor=candidate)
+
+    assert baseline_exam.sections is not None
+    assert candidate_exam.sections is not None
+
+    baseline_pages = {
+        page.page_number: page.text
+        for section in baseline_exam.sections
+        for page in section.pages
+    }
+    candidate_pages = {
+        page.page_number: page.text
+        for section in candidate_exam.sections
+        for page in section.pages
+    }
+    page_diffs = [
+        PageTextDiff(
+            page_number=page_number,
+            baseline_text=baseline_pages.get(page_number),
+            candidate_text=candidate_pages.get(page_number),
+        )
+        for page_number in sorted(baseline_pages.keys() | candidate_pages.keys())
+        if baseline_pages.get(page_number) != candidate_pages.get(page_number)
+    ]
+
+    baseline_questions = {
+        f"{section.type} {question.question_number}": question
+        for section in baseline_exam.sections
+        for question in section.questions or []
+    }
+    candidate_questions = {
+        f"{section.type} {question.question_number}": question
+        for section in candidate_exam.sections
+        for question in section.questions or []
+    }
+    question_diffs = [
+        QuestionDiff(
+            question=key,
+            baseline=baseline_questions.get(key),
+            candidate=candidate_questions.get(key),
+        )
+        for key in sorted(baseline_questions.keys() | candidate_questions.keys())
+        if baseline_questions.get(key) != candidate_questions.get(key)
+    ]
+
+    return ParityReport(
+        exam_path=exam_path,
+        baseline=baseline,
+        candidate=candidate,
+        page_diffs=page_diffs,
+        question_diffs=question_diffs,
+    )
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Compare the output of two page text extractors on FE exams."
+    )
+    arg_parser.add_argument("exam_paths", nargs="+")
+    arg_parser.add_argument(
+        "--baseline", choices=list(EXTRACTORS), default=PypdfExtractor.name
+    )
+    arg_parser.add_argument(
+        "--candidate", choices=list(EXTRACTORS), default=PyMuPDFExtractor.name
+    )
+    args = arg_parser.parse_args()
+
+    all_match = True
+    for exam_path in args.exam_paths:
+        report = check_extractor_parity(exam_path, args.baseline, args.candidate)
+        for page_diff in report.page_diffs:
+            print(f"{exam_path}: page {page_diff.page_number} text differs")
+        for question_diff in report.question_diffs:
+            print(f"{exam_path}: question {question_diff.question} differs")
+        print(
+            f"{exam_path}: {len(report.page_diffs)} page and "
+            f"{len(report.question_diffs)} question differences"
+        )
+        all_match = all_match and report.matches
+
+    sys.exit(0 if all_match else 1)
@@ -0,0 +1,139 @@
+from typing import Dict, Hashable, Iterable, List, NamedTuple, Set, Tuple
+
+from parser.compact import CompactExam, CompactQuestion, CompactSection
+from parser.dataset.exam import Exam
+from parser.model import (
+    Question,
+    QuestionInputType,
+    Section,
+    SectionType,
+    Semester,
+)
+
+
+class QuestionReference(NamedTuple):
+    # the indexed objects themselves, not copies
+    exam: Exam | CompactExam
+    section: Section | CompactSection
+    question: Question | CompactQuestion
+
+
+class ExamIndex:
+    """
+    Lookups of exams by date and of questions by section type, category,
+    sub-category, points and input type, built once over loaded exams.
+    """
+
+    def __init__(self, exams: Iterable[Exam | CompactExam]):
+        self.exams_by_date: Dict[Tuple[str, int], Exam | CompactExam] = {}
+        self.questions: List[QuestionReference] = []
+        self.questions_by_section_type: Dict[SectionType, List[QuestionReference]] = {}
+        self.questions_by_category: Dict[str, List[QuestionReference]] = {}
+        self.questions_by_sub_category: Dict[str, List[QuestionReference]] = {}
+        self.questions_by_max_points: Dict[int, List[QuestionReference]] = {}
+        self.questions_by_input_type: Dict[
+            QuestionInputType, List[QuestionReference]
+        ] = {}
+
+        for exam in exams:
+            assert exam.semester is not None
+            assert exam.year is not None
+            self.exams_by_date.setdefault((exam.semester, exam.year), exam)
+            for section in exam.sections or []:
+                for question in section.questions or []:
+                    reference = QuestionReference(exam, section, question)
+                    self.questions.append(reference)
+                    self.questions_by_section_type.setdefault(
+                        question.section_type, []
+                    ).append(reference)
+                    self.questions_by_category.setdefault(question.category, []).append(
+                        reference
+                    )
+                    self.questions_by_sub_category.setdefault(
+                        question.sub_category, []
+                    ).append(reference)
+                    self.questions_by_max_points.setdefault(
+                        question.max_points, []
+                    ).append(reference)
+                    for input_type in get_input_types(question):
+                        self.questions_by_input_type.setdefault(input_type, []).append(
+                            reference
+                        )
+
+    def get_exam(self, semester: Semester, year: int) -> Exam | CompactExam | None:
+        return self.exams_by_date.get((semester, year))
+
+    def query(
+        self,
+        section_type: SectionType | None = None,
+        category: str | None = None,
+        sub_category: str | None = None,
+        max_points: int | None = None,
+        input_type: QuestionInputType | None = None,
+        semester: Semester | None = None,
+        year: int | None = None,
+    ) -> List[QuestionReference]:
+        """
+        Finds the questions matching every given filter.
+
+        The smallest of the indexes selected by the filters is scanned, and the other
+        filters are checked on its questions.
+
+        Returns:
+        List[QuestionReference]: The matching questions, in load order.
+        """
+        filters: List[Tuple[Dict, Hashable]] = [
+            (index, key)
+            for index, key in [
+                (self.questions_by_section_type, section_type),
+                (self.questions_by_category, category),
+                (self.questions_by_sub_category, sub_category),
+                (self.questions_by_max_points, max_points),
+                (self.questions_by_input_type, input_type),
+            ]
+            if key is not None
+        ]
+
+        candidates = self.questions
+        if len(filters) > 0:
+            candidates = min((index.get(key, []) for index, key in filters), key=len)
+
+        matches: List[QuestionReference] = []
+        for reference in candidates:
+            exam, _, question = reference
+            if section_type is not None and question.section_type != section_type:
+                continue
+            if category is not None and question.category != category:
+                continue
+            if sub_category is not None and question.sub_category != sub_category:
+                continue
+            if max_points is not None and question.max_points != max_points:
+                continue
+            if input_type is not None and input_type not in get_input_types(question):
+                continue
+            if semester is not None and exam.semester != semester:
+                continue
+            if year is not None and exam.year != year:
+                continue
+            matches.append(reference)
+        return matches
+
+
+def get_input_types(question: Question | CompactQuestion) -> Set[QuestionInputType]:
+    # the input types classified for the question, its description and its
+    # sub-questions at every depth
+    input_types: Set[QuestionInputType] = set()
+    for classification in [
+        question.metadata.classification,
+        question.metadata.classification_on_description,
+    ]:
+        if classification is not None:
+            input_types.add(classification.question_input_type)
+
+    sub_questions = list(question.sub_questions)
+    while len(sub_questions) > 0:
+        sub_question = sub_questions.pop()
+        if sub_question.classification is not None:
+            input_types.add(sub_question.classification.question_input_type)
+        sub_questions.extend(sub_question.sub_questions)
+    return input_types
@@ -0,0 +1,323 @@
+import argparse
+import heapq
+import math
+import os
+import time
+from typing import Dict, Iterable, List, NamedTuple, Set, Tuple
+
+from pydantic import BaseModel
+
+from parser.compact import CompactExam, CompactQuestion, CompactSubQuestion
+from parser.dataset.exam import Exam
+from parser.model import (
+    NlpPipeline,
+    Question,
+    SectionType,
+    SubQuestion,
+    get_nlp_pipeline,
+)
+
+# An inverted index of the filtered text of every question and sub-question of the
+# indexed exams, ranked with BM25. The terms of a text are its words without stop
+# words, stemmed, as NlpPipeline does for the metadata of questions.
+
+# Bump whenever the terms of a text or the format of the index change
+SEARCH_INDEX_VERSION = 1
+BM25_K1 = 1.2
+BM25_B = 0.75
+DEFAULT_SEARCH_LIMIT = 10
+
+
+class SearchDocument(BaseModel, strict=True):
+    exam_path: str
+    semester: str | None
+    year: int | None
+    section_type: SectionType
+    category: str
+    question_number: int
+    # identifiers of the sub-question and of the sub-questions containing it, empty
+    # for the text of the question itself
+    sub_question_path: List[str]
+    # number of terms in the text
+    length: int
+
+
+class SearchIndexFile(BaseModel, strict=True):
+    version: int
+    # None where the document of a removed exam was
+    documents: List[SearchDocument | None]
+    # the id and the term frequency of each document containing each term
+    postings: Dict[str, List[Tuple[int, int]]]
+
+
+class SearchResult(NamedTuple):
+    document: SearchDocument
+    score: float
+
+
+class SearchIndex:
+    """
+    BM25 ranked full-text search over the questions and sub-questions of exams, which
+    can be added and removed one exam at a time.
+    """
+
+    def __init__(self, pipeline: NlpPipeline | None = None):
+        self._pipeline = pipeline
+        self.documents: List[SearchDocument | None] = []
+        # term frequency by document id, by term
+        self.postings: Dict[str, Dict[int, int]] = {}
+        # ids of the documents of each exam
+        self.documents_by_exam: Dict[str, List[int]] = {}
+        # terms of the documents of each exam, so that removing an exam only visits
+        # their postings
+        self.terms_by_exam: Dict[str, Set[str]] = {}
+        self.total_length = 0
+
+    @property
+    def pipeline(self) -> NlpPipeline:
+        # only loaded once a text is indexed or searched
+        if self._pipeline is None:
+            self._pipeline = get_nlp_pipeline()
+        return self._pipeline
+
+    def add_exam(self, exam: Exam | CompactExam):
+        """
+        Indexes the questions of an exam, replacing those indexed for the same path.
+        """
+        assert exam.loaded
+        self.remove_exam(exam.exam_path)
+        document_ids: List[int] = []
+        exam_terms: Set[str] = set()
+        for section in exam.sections or []:
+            for question in section.questions or []:
+                for sub_question_path, text in iter_question_texts(question):
+                    terms = self.pipeline.terms(text)
+                    document_id = len(self.documents)
+                    self.documents.append(
+                        SearchDocument(
+                            exam_path=exam.exam_path,
+                            semester=exam.semester,
+                            year=exam.year,
+                            section_type=question.section_type,
+                            category=question.category,
+                            question_number=question.question_number,
+                            sub_question_path=sub_question_path,
+                            length=len(terms),
+                        )
+                    )
+                    document_ids.append(document_id)
+                    self.total_length += len(terms)
+                    exam_terms.update(terms)
+                    for term in terms:
+                        postings = self.postings.setdefault(term, {})
+                        postings[document_id] = postings.get(document_id, 0) + 1
+        self.documents_by_exam[exam.exam_path] = document_ids
+        self.terms_by_exam[exam.exam_path] = exam_terms
+
+    def remove_exam(self, exam_path: str):
+        document_ids = set(self.documents_by_exam.pop(exam_path, []))
+        exam_terms = self.terms_by_exam.pop(exam_path, set())
+        if len(document_ids) == 0:
+            return
+        for document_id in document_ids:
+            document = self.documents[document_id]
+            assert document is not None
+            self.total_length -= document.length
+            self.documents[document_id] = None
+        for term in exam_terms:
+            postings = self.postings[term]
+            for document_id in document_ids.intersection(postings):
+                del postings[document_id]
+            if len(postings) == 0:
+                del self.postings[term]
+
+    def search(
+        self,
+        query: str,
+        section_type: SectionType | None = None,
+        category: str | None = None,
+        limit: int = DEFAULT_SEARCH_LIMIT,
+    ) -> List[SearchResult]:
+        """
+        Ranks the indexed texts containing any term of the query with BM25.
+
+        Args:
+        query (str): Words or phrases to search for, eg. "AVL rotation".
+        section_type (SectionType | None): Only search the questions of this section
+        type.
+        category (str | None): Only search the questions of this category.
+        limit (int): The maximum number of results.
+
+        Returns:
+        List[SearchResult]: The best matching texts, best first.
+        """
+        document_count = sum(len(ids) for ids in self.documents_by_exam.values())
+        if document_count == 0:
+            return []
+        average_length = max(self.total_length / document_count, 1)
+
+        scores: Dict[int, float] = {}
+        for term in set(self.pipeline.terms(query)):
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            idf = math.log(
+                1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5)
+            )
+            for document_id, frequency in postings.items():
+                document = self.documents[document_id]
+                assert document is not None
+                if section_type is not None and document.section_type != section_type:
+                    continue
+                if category is not None and document.category != category:
+                    continue
+                norm = BM25_K1 * (
+                    1 - BM25_B + BM25_B * document.length / average_length
+                )
+                scores[document_id] = scores.get(document_id, 0) + idf * (
+                    frequency * (BM25_K1 + 1) / (frequency + norm)
+                )
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [
+            SearchResult(document, score)
+            for document_id, score in best
+            if (document := self.documents[document_id]) is not None
+        ]
+
+    def compact(self):
+        # drops the documents of removed exams, renumbering the others
+        document_ids: Dict[int, int] = {}
+        documents: List[SearchDocument | None] = []
+        for document_id, document in enumerate(self.documents):
+            if document is not None:
+                document_ids[document_id] = len(documents)
+                documents.append(document)
+        if len(documents) == len(self.documents):
+            return
+
+        self.documents = documents
+        self.postings = {
+            term: {
+                document_ids[document_id]: frequency
+                for document_id, frequency in postings.items()
+            }
+            for term, postings in self.postings.items()
+        }
+        self.documents_by_exam = {
+            exam_path: [document_ids[document_id] for document_id in ids]
+            for exam_path, ids in self.documents_by_exam.items()
+        }
+
+    def write(self, index_path: str):
+        self.compact()
+        index_file = SearchIndexFile(
+            version=SEARCH_INDEX_VERSION,
+            documents=self.documents,
+            postings={
+                term: list(postings.items()) for term, postings in self.postings.items()
+            },
+        )
+        temp_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as index_json:
+            index_json.write(index_file.model_dump_json())
+        os.replace(temp_path, index_path)
+
+    @classmethod
+    def read(
+        cls, index_path: str, pipeline: NlpPipeline | None = None
+    ) -> "SearchIndex":
+        """
+        Reads an index written by SearchIndex.write, or returns an empty index if
+        there is none or it was written by another version.
+        """
+        index = cls(pipeline)
+        try:
+            with open(index_path, "r") as index_json:
+                index_file = SearchIndexFile.model_validate_json(index_json.read())
+        except FileNotFoundError:
+            return index
+        if index_file.version != SEARCH_INDEX_VERSION:
+            print(f"Rebuilding {index_path}, it was written by another version")
+            return index
+
+        index.documents = index_file.documents
+        index.postings = {
+            term: dict(postings) for term, postings in index_file.postings.items()
+        }
+        for document_id, document in enumerate(index.documents):
+            if document is not None:
+                index.documents_by_exam.setdefault(document.exam_path, []).append(
+                    document_id
+                )
+                index.total_length += document.length
+        for term, postings in index.postings.items():
+            for document_id in postings:
+                document = index.documents[document_id]
+                assert document is not None
+                index.terms_by_exam.setdefault(document.exam_path, set()).add(term)
+        return index
+
+
+def iter_question_texts(
+    question: Question | CompactQuestion,
+) -> Iterable[Tuple[List[str], str]]:
+    # the filtered text of the question and of its sub-questions at every depth, with
+    # the path of each sub-question
+    yield [], question.filtered_text
+    sub_questions: List[Tuple[List[str], SubQuestion | CompactSubQuestion]] = [
+        ([sub_question.identifier], sub_question)
+        for sub_question in reversed(question.sub_questions)
+    ]
+    while len(sub_questions) > 0:
+        path, sub_question = sub_questions.pop()
+        yield path, sub_question.filtered_text.text
+        sub_questions.extend(
+            (path + [nested.identifier], nested)
+            for nested in reversed(sub_question.sub_questions)
+        )
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Build and query a full-text search index of parsed exams."
+    )
+    arg_parser.add_argument("index_path")
+    arg_parser.add_argument(
+        "--nltk-data", help="directory of the nltk data, $NLTK_DATA by default"
+    )
+    sub_parsers = arg_parser.add_subparsers(dest="command", required=True)
+    add_parser = sub_parsers.add_parser(
+        "add", help="index the exams of _extracted.json files"
+    )
+    add_parser.add_argument("inputs", nargs="+")
+    query_parser = sub_parsers.add_parser("query", help="print the best matches")
+    query_parser.add_argument("query")
+    query_parser.add_argument("--section-type", choices=list(SectionType))
+    query_parser.add_argument("--category")
+    query_parser.add_argument("--limit", type=int, default=DEFAULT_SEARCH_LIMIT)
+    args = arg_parser.parse_args()
+
+    search_index = SearchIndex.read(args.index_path, NlpPipeline(args.nltk_data))
+    if args.command == "add":
+        for input_file in args.inputs:
+            search_index.add_exam(Exam.read(input_file))
+        search_index.write(args.index_path)
+        print(f"Indexed {len(args.inputs)} exams in {args.index_path}")
+    elif args.command == "query":
+        start = time.perf_counter()
+        results = search_index.search(
+            args.query,
+            SectionType(args.section_type) if args.section_type else None,
+            args.category,
+            args.limit,
+        )
+        seconds = time.perf_counter() - start
+        for document, score in results:
+            sub_question = ".".join(document.sub_question_path)
+            print(
+                f"{score:.3f} {document.exam_path} {document.section_type} "
+                f"Q{document.question_number}{f' ({sub_question})' if sub_question else ''} "
+                f"{document.category}"
+            )
+        print(f"{len(results)} results in {seconds * 1000:.2f}ms")
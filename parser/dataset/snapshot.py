@@ -0,0 +1,185 @@
+import argparse
+import mmap
+import os
+import struct
+import time
+from typing import Dict, Iterable, List
+
+from pydantic import BaseModel
+
+from parser.compact import CompactExam
+from parser.dataset.exam import Exam
+
+# A snapshot stores many parsed exams in one file: a header, an index of the exams and
+# the json record of each exam, as written by Exam.write. Opening a snapshot only reads
+# its index. The file is memory-mapped and each record is read and validated when its
+# exam is accessed, so the records of exams that are never used are never read.
+#
+# Records are validated from json by pydantic-core, which builds the models faster
+# than model_construct does from python objects, so skipping validation would not
+# make reading them faster.
+
+SNAPSHOT_MAGIC = b"FESNAP"
+SNAPSHOT_VERSION = 1
+# magic, version, length of the index
+header_struct = struct.Struct("<6sHQ")
+
+
+class SnapshotEntry(BaseModel, strict=True):
+    exam_path: str
+    semester: str | None
+    year: int | None
+    # location of the record of the exam, relative to the end of the index
+    offset: int
+    length: int
+
+
+class SnapshotIndex(BaseModel, strict=True):
+    entries: List[SnapshotEntry]
+
+
+def write_snapshot(
+    exams: Iterable[Exam | CompactExam], snapshot_path: str, include_pages: bool = True
+) -> int:
+    """
+    Writes exams to a snapshot, replacing it atomically.
+
+    Args:
+    exams (Iterable[Exam | CompactExam]): The loaded exams.
+    snapshot_path (str): The file to write.
+    include_pages (bool): Whether to store the pages of each section, compact exams
+    have none.
+
+    Returns:
+    int: The size of the snapshot in bytes.
+    """
+    records: List[bytes] = []
+    entries: List[SnapshotEntry] = []
+    offset = 0
+    for exam in exams:
+        if isinstance(exam, CompactExam):
+            exam = exam.to_model()
+        assert exam.loaded
+        if include_pages:
+            record = exam.model_dump_json()
+        else:
+            record = exam.model_dump_json(exclude={"sections": {"__all__": {"pages"}}})
+        records.append(record.encode())
+        entries.append(
+            SnapshotEntry(
+                exam_path=exam.exam_path,
+                semester=exam.semester,
+                year=exam.year,
+                offset=offset,
+                length=len(records[-1]),
+            )
+        )
+        offset += len(records[-1])
+    index = SnapshotIndex(entries=entries).model_dump_json().encode()
+
+    temp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as snapshot_file:
+        snapshot_file.write(
+            header_struct.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(index))
+        )
+        snapshot_file.write(index)
+        snapshot_file.writelines(records)
+    os.replace(temp_path, snapshot_path)
+    return header_struct.size + len(index) + offset
+
+
+class Snapshot:
+    """
+    Read-only access to the exams of a snapshot written by write_snapshot.
+    """
+
+    def __init__(self, snapshot_path: str):
+        self.snapshot_path = snapshot_path
+        with open(snapshot_path, "rb") as snapshot_file:
+            if os.fstat(snapshot_file.fileno()).st_size < header_struct.size:
+                raise ValueError(f"{snapshot_path} is not a snapshot")
+            # the mapping stays valid once the file is closed
+            self.data = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, index_length = header_struct.unpack_from(self.data)
+        if magic != SNAPSHOT_MAGIC:
+            self.close()
+            raise ValueError(f"{snapshot_path} is not a snapshot")
+        if version != SNAPSHOT_VERSION:
+            self.close()
+            raise ValueError(
+                f"{snapshot_path} has version {version}, expected {SNAPSHOT_VERSION}"
+            )
+        self.records_start = header_struct.size + index_length
+        index = SnapshotIndex.model_validate_json(
+            self.data[header_struct.size : self.records_start]
+        )
+        self.entries = index.entries
+        self.entries_by_path: Dict[str, SnapshotEntry] = {
+            entry.exam_path: entry for entry in self.entries
+        }
+
+    def read_exam(self, exam_path: str) -> Exam:
+        entry = self.entries_by_path[exam_path]
+        start = self.records_start + entry.offset
+        return Exam.from_json(self.data[start : start + entry.length])
+
+    def read_exams(self) -> List[Exam]:
+        return [self.read_exam(entry.exam_path) for entry in self.entries]
+
+    def close(self):
+        self.data.close()
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_snapshot(snapshot_path: str) -> List[Exam]:
+    with Snapshot(snapshot_path) as snapshot:
+        return snapshot.read_exams()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Write and read snapshots of parsed exams."
+    )
+    sub_parsers = arg_parser.add_subparsers(dest="command", required=True)
+    write_parser = sub_parsers.add_parser(
+        "write", help="write the exams of _extracted.json files to a snapshot"
+    )
+    write_parser.add_argument("snapshot_path")
+    write_parser.add_argument("inputs", nargs="+")
+    write_parser.add_argument(
+        "--no-pages", action="store_true", help="leave the pages out of the snapshot"
+    )
+    read_parser = sub_parsers.add_parser(
+        "read", help="print the number of exams and questions and the time to read them"
+    )
+    read_parser.add_argument("snapshot_path")
+    args = arg_parser.parse_args()
+
+    if args.command == "write":
+        size = write_snapshot(
+            [Exam.read(input_file) for input_file in args.inputs],
+            args.snapshot_path,
+            include_pages=not args.no_pages,
+        )
+        print(f"Wrote {len(args.inputs)} exams to {args.snapshot_path}, {size} bytes")
+    elif args.command == "read":
+        start = time.perf_counter()
+        with Snapshot(args.snapshot_path) as snapshot:
+            open_seconds = time.perf_counter() - start
+            exams = snapshot.read_exams()
+        seconds = time.perf_counter() - start
+        questions = sum(
+            len(section.questions or [])
+            for exam in exams
+            for section in exam.sections or []
+        )
+        print(
+            f"Opened in {open_seconds:.4f}s, read {len(exams)} exams and {questions} "
+            f"questions in {seconds:.4f}s"
+        )
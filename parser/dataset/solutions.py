@@ -0,0 +1,180 @@
+import argparse
+import os
+import sys
+from typing import Dict, List, Tuple
+
+from parser.compact import (
+    CompactExam,
+    CompactQuestion,
+    CompactSubQuestion,
+    load_compact_exam,
+)
+from parser.dataset.exam import DEFAULT_PAGE_WORKERS, Exam
+from parser.dataset.page_cache import PageCache
+from parser.model import Question, SectionType, SubQuestion
+from parser.profiling import stage
+from parser.text_extraction import DEFAULT_EXTRACTOR, PageTextExtractor
+
+# A solutions pdf is the exam with the answers written in, so it is parsed like the
+# exam and its questions are matched to those of the exam by section, question number
+# and the identifiers of the sub-questions leading to them. The keys of every question
+# and sub-question of the solutions are indexed once, and each question of the exam is
+# looked up in the index, so aligning an exam takes a single pass over each side.
+#
+# The solution of a question is the filtered text of the matching question of the
+# solutions, which repeats the question along with its answer.
+
+# section type, question number, and identifiers of the sub-question and of the
+# sub-questions containing it, empty for the question itself
+SolutionKey = Tuple[SectionType, int, Tuple[str, ...]]
+SolvableItem = Question | SubQuestion | CompactQuestion | CompactSubQuestion
+
+SOLUTIONS_SUFFIX = "_solutions.pdf"
+
+
+def get_solutions_path(solutions_dir: str | None, exam_path: str) -> str | None:
+    """
+    Returns the path of the solutions pdf of an exam, named after the exam pdf with
+    SOLUTIONS_SUFFIX, or None if the solutions directory has none.
+    """
+    if solutions_dir is None:
+        return None
+    solutions_path = os.path.join(
+        solutions_dir,
+        os.path.basename(exam_path).removesuffix(".pdf") + SOLUTIONS_SUFFIX,
+    )
+    return solutions_path if os.path.isfile(solutions_path) else None
+
+
+def index_solutions(solutions: Exam | CompactExam) -> Dict[SolutionKey, str]:
+    """
+    Indexes the text of every question and sub-question of a parsed solutions pdf.
+
+    Args:
+    solutions (Exam | CompactExam): The parsed solutions.
+
+    Returns:
+    Dict[SolutionKey, str]: The filtered text of each question and sub-question, by
+    its key.
+    """
+    index: Dict[SolutionKey, str] = {}
+    for section in solutions.sections or []:
+        for question in section.questions or []:
+            key: SolutionKey = (question.section_type, question.question_number, ())
+            index[key] = question.filtered_text
+            sub_questions: List[
+                Tuple[SolutionKey, SubQuestion | CompactSubQuestion]
+            ] = [
+                ((*key[:2], (sub_question.identifier,)), sub_question)
+                for sub_question in question.sub_questions
+            ]
+            while len(sub_questions) > 0:
+                sub_key, sub_question = sub_questions.pop()
+                index[sub_key] = sub_question.filtered_text.text
+                sub_questions.extend(
+                    ((*sub_key[:2], sub_key[2] + (nested.identifier,)), nested)
+                    for nested in sub_question.sub_questions
+                )
+    return index
+
+
+def attach_solutions(exam: Exam | CompactExam, solutions: Exam | CompactExam) -> int:
+    """
+    Sets the solution of every question and sub-question of the exam that has a
+    matching one in the solutions, see index_solutions.
+
+    Returns:
+    int: The number of questions and sub-questions given a solution.
+    """
+    assert exam.loaded
+    assert solutions.loaded
+    index = index_solutions(solutions)
+    aligned = 0
+    for section in exam.sections or []:
+        for question in section.questions or []:
+            key: SolutionKey = (question.section_type, question.question_number, ())
+            items: List[Tuple[SolutionKey, SolvableItem]] = [(key, question)]
+            while len(items) > 0:
+                sub_key, item = items.pop()
+                item.solution = index.get(sub_key)
+                if item.solution is not None:
+                    aligned += 1
+                items.extend(
+                    ((*sub_key[:2], sub_key[2] + (nested.identifier,)), nested)
+                    for nested in item.sub_questions
+                )
+    return aligned
+
+
+def load_solutions(
+    exam: Exam | CompactExam,
+    solutions_path: str,
+    extractor: str | PageTextExtractor = DEFAULT_EXTRACTOR,
+    cache: PageCache | None = None,
+    page_workers: int = DEFAULT_PAGE_WORKERS,
+) -> int:
+    """
+    Parses a solutions pdf and attaches its solutions to the exam, see
+    attach_solutions. The solutions are parsed into a CompactExam, so only the texts
+    of the aligned solutions are materialized.
+
+    Args:
+    exam (Exam | CompactExam): The parsed exam.
+    solutions_path (str): The path of the solutions pdf of the exam.
+    extractor (str | PageTextExtractor): The page text extractor to use.
+    cache (PageCache | None): Cache of the extracted pages.
+    page_workers (int): The number of processes extracting the pages.
+
+    Returns:
+    int: The number of questions and sub-questions given a solution.
+    """
+    solutions = load_compact_exam(solutions_path, extractor, cache, page_workers)
+    with stage("align_solutions"):
+        aligned = attach_solutions(exam, solutions)
+    exam.solutions_path = solutions_path
+    return aligned
+
+
+def try_load_solutions(
+    exam: Exam | CompactExam,
+    solutions_path: str,
+    extractor: str | PageTextExtractor = DEFAULT_EXTRACTOR,
+    cache: PageCache | None = None,
+    page_workers: int = DEFAULT_PAGE_WORKERS,
+) -> int | None:
+    """
+    Same as load_solutions, but a solutions pdf that can't be parsed leaves the exam
+    without solutions instead of failing it.
+
+    Returns:
+    int | None: The number of questions and sub-questions given a solution, or None
+    if the solutions could not be loaded.
+    """
+    try:
+        return load_solutions(exam, solutions_path, extractor, cache, page_workers)
+    except Exception as e:
+        print(
+            f"Could not load the solutions of {exam.exam_path} from {solutions_path}: "
+            f"{type(e).__name__}: {e}",
+            file=sys.stderr,
+        )
+        return None
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Print the solution of each question of an exam."
+    )
+    arg_parser.add_argument("exam_path")
+    arg_parser.add_argument("solutions_path")
+    args = arg_parser.parse_args()
+
+    parsed_exam = load_compact_exam(args.exam_path)
+    aligned_count = load_solutions(parsed_exam, args.solutions_path)
+    for parsed_section in parsed_exam.sections:
+        for parsed_question in parsed_section.questions:
+            print(
+                f"{parsed_section.type} Q{parsed_question.question_number}: "
+                f"{parsed_question.solution!r}"
+            )
+    print(f"{aligned_count} questions and sub-questions aligned with a solution")
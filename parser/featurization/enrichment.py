@@ -0,0 +1,293 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, NamedTuple, Protocol, Type, TypeVar
+
+from pydantic import BaseModel
+
+from parser.dataset.exam import Exam
+from parser.model import (
+    Metadata,
+    QuestionClassification,
+    QuestionDescription,
+    QuestionNaming,
+)
+
+ResponseModel = TypeVar("ResponseModel", bound=BaseModel)
+
+Messages = List[Dict[str, str]]
+
+
+class CompletionFunction(Protocol):
+    # Same signature as the create function returned by instructor.patch, eg.
+    # instructor.patch(create=llama.create_chat_completion_openai_v1,
+    # mode=instructor.Mode.JSON_SCHEMA)
+    def __call__(
+        self, messages: Messages, response_model: Type[ResponseModel]
+    ) -> ResponseModel: ...
+
+
+class EnrichmentStats(BaseModel, strict=True):
+    # number of responses assigned to a question or sub-question
+    prompts: int = 0
+    # number of distinct prompts among them
+    unique_prompts: int = 0
+    cache_hits: int = 0
+    model_calls: int = 0
+
+
+class Prompt(NamedTuple):
+    messages: Messages
+    response_model: Type[BaseModel]
+    # stores the response on the question or sub-question the prompt was made for
+    assign: Callable[[BaseModel], None]
+
+
+def get_classification_messages(
+    primary_text: str, sub_text: str | None = None
+) -> Messages:
+    prompt: str = (
+        f"Extract the expected input type for the following exam question: "
+        f"Main Question: <text>{primary_text}</text>"
+        f"{' Sub Question: <text>' + sub_text + '</text>' if sub_text is not None else ''}"
+    )
+    return [
+        {
+            "role": "system",
+            "content": (
+                "You are an expert at analyzing exam questions. "
+                "Your task is to determine the type of input expected for each question. "
+                "Focus on identifying the expected input type based on the question's context. "
+                "Do not attempt to solve the question itself."
+            ),
+        },
+        {
+            "role": "user",
+            "content": prompt,
+        },
+    ]
+
+
+def get_description_messages(
+    primary_text: str, sub_text: str | None = None
+) -> Messages:
+    prompt: str = (
+        f"Extract the expected input type for the following exam question: "
+        f"Main Question: <text>{primary_text}</text>"
+        f"{' Sub Question: <text>' + sub_text + '</text>' if sub_text is not None else ''}"
+    )
+    return [
+        {
+            "role": "system",
+            "content": (
+                "You are an expert at analyzing exam questions. "
+                "Your task is to determine what the exam question is asking for."
+                "Focus on identifying what the user would have to input to correctly answer the question."
+                "Do not attempt to solve the question itself."
+            ),
+        },
+        {
+            "role": "user",
+            "content": prompt,
+        },
+    ]
+
+
+def get_naming_messages(data: str) -> Messages:
+    return [
+        {
+            "role": "system",
+            "content": (
+                "You are an expert at extracting information from exams. "
+                "You will be given a question from a Computer Science exam, "
+                "and you will need to generate a name for the question. "
+                "Follow a leetcode naming convention. "
+                "Do not solve the question. "
+            ),
+        },
+        {
+            "role": "user",
+            "content": (f"Extract name from the following text: <text>{data}</text>"),
+        },
+    ]
+
+
+class ResponseCache:
+    """
+    On-disk cache of model responses, keyed by a hash of the model name, the prompt
+    and the schema of the response model.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get(
+        self, key: str, response_model: Type[ResponseModel]
+    ) -> ResponseModel | None:
+        try:
+            with open(self._get_path(key), "r") as cache_file:
+                return response_model.model_validate_json(cache_file.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def put(self, key: str, response: BaseModel):
+        path = self._get_path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as cache_file:
+            cache_file.write(response.model_dump_json())
+        os.replace(temp_path, path)
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ".json")
+
+
+class Enricher:
+    """
+    Fills the classification, description and generated name of every question and
+    sub-question with a language model.
+
+    Identical prompts are sent to the model once, responses are cached on disk, and
+    requests run concurrently on at most max_workers threads.
+    """
+
+    def __init__(
+        self,
+        create: CompletionFunction,
+        model_name: str,
+        cache_dir: str | None = None,
+        max_workers: int = 4,
+    ):
+        self.create = create
+        self.model_name = model_name
+        self.cache = ResponseCache(cache_dir) if cache_dir is not None else None
+        self.max_workers = max_workers
+
+    def enrich(self, exams: Iterable[Exam]) -> EnrichmentStats:
+        stats = EnrichmentStats()
+
+        prompts: List[Prompt] = []
+        descriptions: List[Metadata] = []
+        for exam in exams:
+            assert exam.loaded
+            for section in exam.sections or []:
+                for question in section.questions or []:
+                    prompts.append(
+                        Prompt(
+                            get_naming_messages(question.original_text),
+                            QuestionNaming,
+                            lambda response, metadata=question.metadata: setattr(
+                                metadata, "generated_name", response.name
+                            ),
+                        )
+                    )
+
+                    if len(question.sub_questions) == 0:
+                        prompts.append(
+                            Prompt(
+                                get_classification_messages(question.filtered_text),
+                                QuestionClassification,
+                                lambda response, metadata=question.metadata: setattr(
+                                    metadata, "classification", response
+                                ),
+                            )
+                        )
+                        prompts.append(
+                            Prompt(
+                                get_description_messages(question.filtered_text),
+                                QuestionDescription,
+                                lambda response, metadata=question.metadata: setattr(
+                                    metadata, "description", response
+                                ),
+                            )
+                        )
+                        descriptions.append(question.metadata)
+                        continue
+
+                    for sub_question in question.sub_questions:
+                        prompts.append(
+                            Prompt(
+                                get_classification_messages(
+                                    question.filtered_text,
+                                    sub_question.filtered_text.text,
+                                ),
+                                QuestionClassification,
+                                lambda response, sub_question=sub_question: setattr(
+                                    sub_question, "classification", response
+                                ),
+                            )
+                        )
+
+        self.run(prompts, stats)
+
+        # the description of a question is classified once it has been generated
+        self.run(
+            [
+                Prompt(
+                    get_classification_messages(metadata.description.description),
+                    QuestionClassification,
+                    lambda response, metadata=metadata: setattr(
+                        metadata, "classification_on_description", response
+                    ),
+                )
+                for metadata in descriptions
+                if metadata.description is not None
+            ],
+            stats,
+        )
+
+        return stats
+
+    def run(self, prompts: List[Prompt], stats: EnrichmentStats):
+        prompts_by_key: Dict[str, List[Prompt]] = {}
+        for prompt in prompts:
+            prompts_by_key.setdefault(self.get_key(prompt), []).append(prompt)
+
+        stats.prompts += len(prompts)
+        stats.unique_prompts += len(prompts_by_key)
+
+        responses: Dict[str, BaseModel] = {}
+        missing: List[str] = []
+        for key, key_prompts in prompts_by_key.items():
+            cached = (
+                self.cache.get(key, key_prompts[0].response_model)
+                if self.cache is not None
+                else None
+            )
+            if cached is None:
+                missing.append(key)
+            else:
+                responses[key] = cached
+                stats.cache_hits += 1
+
+        def complete(key: str) -> BaseModel:
+            prompt = prompts_by_key[key][0]
+            response = self.create(
+                messages=prompt.messages, response_model=prompt.response_model
+            )
+            if self.cache is not None:
+                self.cache.put(key, response)
+            return response
+
+        if len(missing) > 0:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for key, response in zip(missing, executor.map(complete, missing)):
+                    responses[key] = response
+                    stats.model_calls += 1
+
+        for key, key_prompts in prompts_by_key.items():
+            for prompt in key_prompts:
+                prompt.assign(responses[key])
+
+    def get_key(self, prompt: Prompt) -> str:
+        return hashlib.sha256(
+            json.dumps(
+                {
+                    "model": self.model_name,
+                    "messages": prompt.messages,
+                    "response_model": prompt.response_model.model_json_schema(),
+                },
+                sort_keys=True,
+            ).encode()
+        ).hexdigest()
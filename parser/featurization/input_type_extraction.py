@@ -1,7 +1,12 @@
 import re
-from typing import List
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Tuple
 
-from parser.model import Question, QuestionInputType
+import numpy as np
+
+from parser.compact import CompactExam, CompactQuestion, CompactSubQuestion
+from parser.dataset.exam import Exam
+from parser.model import Question, QuestionInputType, SubQuestion
 
 
 class InputTypeExtraction:
@@ -52,5 +57,269 @@ def contains_braces_with_newlines(text: str, n: int) -> bool:
     Returns:
     bool: True if the pattern is found, False otherwise.
     """
-    pattern = r"\{" + r"(?:\n){" + str(n) + r",}\}"
-    return re.search(pattern, text) is not None
+    return get_braces_with_newlines_pattern(n).search(text) is not None
+
+
+@lru_cache
+def get_braces_with_newlines_pattern(n: int) -> re.Pattern[str]:
+    return re.compile(r"\{" + r"(?:\n){" + str(n) + r",}\}")
+
+
+# A cue is a word, phrase or symbol hinting at one or more input types. The words of a
+# text are found in one scan and looked up in tables, rather than matching a pattern
+# per word.
+CUES: List[str] = [
+    "code_block",
+    "blanks",
+    "boolean",
+    "choice",
+    "postfix",
+    "stack",
+    "time_complexity",
+    "space_complexity",
+    "proof",
+    "explain",
+    "brief",
+    "evaluate",
+    "time_units",
+    "table",
+    "linked_list",
+    "list_edit",
+    "base",
+    "integer",
+]
+CUE_COLUMNS: Dict[str, int] = {cue: column for column, cue in enumerate(CUES)}
+INPUT_TYPES: List[QuestionInputType] = list(QuestionInputType)
+
+# The symbol cues and the blanks are found in one scan of the text. Every alternative
+# starts with a literal, so re only tries them at the positions holding one of these
+# characters, and the cue of a match is told by its first character. Word boundaries
+# are checked by lookbehinds after the literal for the same reason. No match consumes
+# text in which another cue could start, the parenthesis after "O" is only looked
+# ahead at, so each cue is found as if its pattern was searched on its own.
+symbol_pattern = re.compile(
+    # code_block, see get_braces_with_newlines_pattern
+    r"\{\n{8,}\}"
+    r"|->\s*next\b"
+    r"|\(\s*[tT]\s*/\s*[fF]\s*\)"
+    # an option at the start of a line
+    r"|\n[^\S\n]*\(?[A-E]\)\s"
+    r"|O(?<!\wO)(?=\s*\()"
+    r"|_{8,}"
+)
+# an option at the start of the text, which has no newline before it
+leading_choice_pattern = re.compile(r"[^\S\n]*\(?[A-E]\)\s")
+SYMBOL_CUES: Dict[str, str] = {
+    "{": "code_block",
+    "-": "linked_list",
+    "(": "boolean",
+    "\n": "choice",
+    "O": "time_complexity",
+    "_": "blanks",
+}
+# searched in the lowercased text
+base_pattern = re.compile(r"base(?<!\wbase)\s*\d+\b")
+word_pattern = re.compile(r"[a-z]+")
+WORD_CUES: Dict[str, str] = {
+    "circle": "choice",
+    "postfix": "postfix",
+    "stack": "stack",
+    "stacks": "stack",
+    "runtime": "time_complexity",
+    "prove": "proof",
+    "proof": "proof",
+    "derive": "proof",
+    "induction": "proof",
+    "recurrence": "proof",
+    "explain": "explain",
+    "justify": "explain",
+    "describe": "explain",
+    "why": "explain",
+    "briefly": "brief",
+    "evaluate": "evaluate",
+    "compute": "evaluate",
+    "calculate": "evaluate",
+    "simplify": "evaluate",
+    "summation": "evaluate",
+    "ms": "time_units",
+    "millisecond": "time_units",
+    "milliseconds": "time_units",
+    "second": "time_units",
+    "seconds": "time_units",
+    "table": "table",
+    "insert": "list_edit",
+    "inserted": "list_edit",
+    "insertion": "list_edit",
+    "delete": "list_edit",
+    "deleted": "list_edit",
+    "deletion": "list_edit",
+    "remove": "list_edit",
+    "removed": "list_edit",
+    "reverse": "list_edit",
+    "reversed": "list_edit",
+    "binary": "base",
+    "hexadecimal": "base",
+    "octal": "base",
+    "printed": "integer",
+    "output": "integer",
+}
+PHRASE_CUES: Dict[Tuple[str, ...], str] = {
+    ("true", "or", "false"): "boolean",
+    ("true", "false"): "boolean",
+    ("yes", "or", "no"): "boolean",
+    ("which", "of", "the", "following"): "choice",
+    ("run", "time"): "time_complexity",
+    ("running", "time"): "time_complexity",
+    ("time", "complexity"): "time_complexity",
+    ("big", "o"): "time_complexity",
+    ("big", "oh"): "time_complexity",
+    ("space", "complexity"): "space_complexity",
+    ("auxiliary", "space"): "space_complexity",
+    ("extra", "memory"): "space_complexity",
+    ("show", "that"): "proof",
+    ("one", "sentence"): "brief",
+    ("name", "the"): "brief",
+    ("list", "the"): "brief",
+    ("closed", "form"): "evaluate",
+    ("linked", "list"): "linked_list",
+    ("linked", "lists"): "linked_list",
+    ("how", "many"): "integer",
+    ("what", "value"): "integer",
+    ("what", "is", "the", "value"): "integer",
+    ("return", "value"): "integer",
+}
+# the phrases, space delimited, by their first word
+PHRASE_STARTS: Dict[str, List[Tuple[str, str]]] = {}
+for phrase, phrase_cue in PHRASE_CUES.items():
+    PHRASE_STARTS.setdefault(phrase[0], []).append(
+        (f" {' '.join(phrase)} ", phrase_cue)
+    )
+
+COUNTS = ["characters", "lines", "words", "blanks"]
+
+
+class FeatureRow(NamedTuple):
+    question: Question | CompactQuestion
+    # None for the row of the question itself
+    sub_question: SubQuestion | CompactSubQuestion | None
+
+
+class InputTypeFeatures(NamedTuple):
+    """
+    Columnar input type features of many texts, one row per text.
+    """
+
+    rows: List[FeatureRow]
+    # (texts, len(CUES)) bool, whether each cue appears in each text
+    cues: np.ndarray
+    # (texts, len(INPUT_TYPES)) bool, the input types each text may expect
+    input_types: np.ndarray
+    # (texts, len(COUNTS)) int32
+    counts: np.ndarray
+
+    def get_possible_input_types(self, row: int) -> List[QuestionInputType]:
+        return [INPUT_TYPES[column] for column in np.flatnonzero(self.input_types[row])]
+
+
+def featurize_texts(texts: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Computes the cues, input types and counts of texts.
+
+    Returns:
+    Tuple[np.ndarray, np.ndarray, np.ndarray]: The cues, input types and counts
+    columns, see InputTypeFeatures.
+    """
+    # filled as lists, setting single items of numpy arrays is slow
+    cue_rows: List[List[bool]] = []
+    count_rows: List[Tuple[int, int, int, int]] = []
+    for text in texts:
+        row = [False] * len(CUES)
+        if leading_choice_pattern.match(text) is not None:
+            row[CUE_COLUMNS["choice"]] = True
+        blanks = 0
+        for symbol in symbol_pattern.findall(text):
+            cue = SYMBOL_CUES[symbol[0]]
+            if cue == "blanks":
+                blanks += 1
+            row[CUE_COLUMNS[cue]] = True
+
+        lowered = text.lower()
+        if base_pattern.search(lowered) is not None:
+            row[CUE_COLUMNS["base"]] = True
+
+        words = word_pattern.findall(lowered)
+        distinct_words = set(words)
+        for word in distinct_words.intersection(WORD_CUES):
+            row[CUE_COLUMNS[WORD_CUES[word]]] = True
+        # only joined when a phrase may be in the text
+        joined = None
+        for start in distinct_words.intersection(PHRASE_STARTS):
+            joined = joined or f" {' '.join(words)} "
+            for phrase, phrase_cue in PHRASE_STARTS[start]:
+                if phrase in joined:
+                    row[CUE_COLUMNS[phrase_cue]] = True
+
+        cue_rows.append(row)
+        count_rows.append((len(text), text.count("\n") + 1, len(words), blanks))
+
+    cues = np.array(cue_rows, dtype=np.bool_).reshape(len(texts), len(CUES))
+    counts = np.array(count_rows, dtype=np.int32).reshape(len(texts), len(COUNTS))
+    return cues, get_input_types(cues), counts
+
+
+def get_input_types(cues: np.ndarray) -> np.ndarray:
+    def cue(name: str) -> np.ndarray:
+        return cues[:, CUE_COLUMNS[name]]
+
+    proof = cue("proof") | cue("explain")
+    signals: Dict[QuestionInputType, np.ndarray] = {
+        QuestionInputType.CODE_FREE_RESPONSE: cue("code_block"),
+        # blanks are filled with code, or picked from a list of options
+        QuestionInputType.CODE_FILL_BLANKS: cue("blanks"),
+        QuestionInputType.MULTIPLE_CHOICE: cue("choice") | cue("blanks"),
+        QuestionInputType.BOOLEAN: cue("boolean"),
+        QuestionInputType.SHORT_ANSWER: cue("brief"),
+        QuestionInputType.LONG_ANSWER: cue("explain"),
+        QuestionInputType.MATH_FREE_RESPONSE: cue("proof"),
+        QuestionInputType.MATH_SINGLE_ANSWER: cue("evaluate"),
+        QuestionInputType.TIME_MILLISECONDS: cue("time_units"),
+        QuestionInputType.TABLE: cue("table"),
+        QuestionInputType.LINKED_LIST_MODIFICATION: cue("linked_list")
+        & cue("list_edit"),
+        QuestionInputType.CONVERT_INFIX_TO_POSTFIX_WITH_STACK: cue("postfix")
+        & cue("stack"),
+        QuestionInputType.CONVERT_INFIX_TO_POSTFIX_WITHOUT_STACK: cue("postfix")
+        & ~cue("stack"),
+        QuestionInputType.BASE_CONVERSION: cue("base"),
+        QuestionInputType.TIME_COMPLEXITY: cue("time_complexity") & ~proof,
+        QuestionInputType.SPACE_COMPLEXITY: cue("space_complexity") & ~proof,
+        QuestionInputType.TIME_COMPLEXITY_WITH_PROOF: cue("time_complexity") & proof,
+        QuestionInputType.SPACE_COMPLEXITY_WITH_PROOF: cue("space_complexity") & proof,
+        QuestionInputType.INTEGER_ANSWER: cue("integer"),
+    }
+    return np.stack([signals[input_type] for input_type in INPUT_TYPES], axis=1)
+
+
+def featurize_exams(exams: Iterable[Exam | CompactExam]) -> InputTypeFeatures:
+    """
+    Computes the input type features of every question and sub-question, at every
+    depth, of the exams.
+
+    The text of a question is its filtered text, without its sub-questions.
+    """
+    rows: List[FeatureRow] = []
+    texts: List[str] = []
+    for exam in exams:
+        for section in exam.sections or []:
+            for question in section.questions or []:
+                rows.append(FeatureRow(question, None))
+                texts.append(question.filtered_text)
+                sub_questions = list(reversed(question.sub_questions))
+                while len(sub_questions) > 0:
+                    sub_question = sub_questions.pop()
+                    rows.append(FeatureRow(question, sub_question))
+                    texts.append(sub_question.filtered_text.text)
+                    sub_questions.extend(reversed(sub_question.sub_questions))
+
+    cues, input_types, counts = featurize_texts(texts)
+    return InputTypeFeatures(rows, cues, input_types, counts)
@@ -0,0 +1,280 @@
+import argparse
+import itertools
+import math
+import re
+import zlib
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from parser.compact import CompactExam
+from parser.dataset.exam import Exam
+from parser.dataset.question_index import QuestionReference
+
+# Questions reused across exams, as is or lightly edited, share most of their word
+# shingles. The MinHash signature of the shingles of a text estimates the Jaccard
+# similarity of two texts by the fraction of equal values. Locality-sensitive hashing
+# puts texts whose signatures agree on a whole band of values in the same bucket, so
+# only the texts sharing a bucket are compared, rather than every pair of texts.
+#
+# With b bands of r values, texts of similarity s share a bucket with probability
+# 1 - (1 - s^r)^b, a steep curve around (1 / b)^(1 / r). The default bands put it at
+# about 0.42, well below the default threshold, so that texts of similarity 0.7 are
+# missed with probability 1e-4. The texts sharing a bucket are then compared by their
+# whole signatures.
+
+DEFAULT_SHINGLE_SIZE = 3
+DEFAULT_NUM_PERMUTATIONS = 128
+DEFAULT_BANDS = 32
+DEFAULT_THRESHOLD = 0.7
+# fixed so that the signatures, and so the clusters, are the same on every run
+MINHASH_SEED = 0
+# shingles permuted per chunk, the chunk takes num_permutations * 4 bytes per shingle
+SIGNATURE_CHUNK_SHINGLES = 1 << 15
+# rows of a bucket compared to the whole bucket at once
+SIMILARITY_BLOCK_ROWS = 64
+# odd, multiplying by it mixes the position of a word in a shingle into its hash
+SHINGLE_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+word_pattern = re.compile(r"[a-z0-9]+")
+
+
+def get_shingles(
+    texts: List[str], shingle_size: int = DEFAULT_SHINGLE_SIZE
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Hashes the word shingles of texts, compared case insensitively, all at once.
+
+    Args:
+    texts (List[str]): The texts to shingle.
+    shingle_size (int): The number of consecutive words in a shingle. A shorter text
+    is a single shingle, and a text without words has none.
+
+    Returns:
+    Tuple[np.ndarray, np.ndarray]: The uint32 shingle hashes of every text, one text
+    after the other, and the len(texts) + 1 offsets at which those of each text start.
+    """
+    text_words = [word_pattern.findall(text.lower()) for text in texts]
+    words = list(itertools.chain.from_iterable(text_words))
+    # crc32 is stable across processes, unlike hash
+    word_hashes: Dict[str, int] = {
+        word: zlib.crc32(word.encode()) for word in set(words)
+    }
+    hashes = np.fromiter(
+        map(word_hashes.__getitem__, words), dtype=np.uint64, count=len(words)
+    )
+    lengths = np.array([len(words) for words in text_words], dtype=np.int64)
+    word_offsets = np.concatenate(([0], np.cumsum(lengths)))
+
+    # the shingle starting at each word, mixing in the words of its text only
+    positions = np.arange(len(words))
+    text_starts = np.repeat(word_offsets[:-1], lengths)
+    text_ends = np.repeat(word_offsets[1:], lengths)
+    padded = np.concatenate((hashes, np.zeros(shingle_size, dtype=np.uint64)))
+    shingles = np.zeros(len(words), dtype=np.uint64)
+    for position in range(shingle_size):
+        shingles = np.where(
+            positions + position < text_ends,
+            (shingles * SHINGLE_MIX) ^ padded[position : position + len(words)],
+            shingles,
+        )
+    complete = positions + shingle_size <= text_ends
+    short_text = (positions == text_starts) & (text_ends - text_starts < shingle_size)
+    shingles = shingles[complete | short_text]
+    shingles = (shingles ^ (shingles >> np.uint64(32))).astype(np.uint32)
+
+    counts = np.where(lengths >= shingle_size, lengths - shingle_size + 1, lengths > 0)
+    return shingles, np.concatenate(([0], np.cumsum(counts)))
+
+
+def get_signatures(
+    shingles: np.ndarray,
+    offsets: np.ndarray,
+    num_permutations: int = DEFAULT_NUM_PERMUTATIONS,
+    seed: int = MINHASH_SEED,
+) -> np.ndarray:
+    """
+    Computes the MinHash signature of each text from its shingles, see get_shingles.
+
+    Each permutation is a * x + b mod 2^32 with an odd a, a bijection of the 32-bit
+    shingle hashes, which numpy computes without a modulo as uint32 wraps around.
+
+    Returns:
+    np.ndarray: (len(offsets) - 1, num_permutations) uint32, the minimum of each
+    permutation over the shingles of each text, the maximum value for texts without
+    shingles.
+    """
+    rng = np.random.default_rng(seed)
+    a = (
+        rng.integers(0, 1 << 32, num_permutations, dtype=np.uint64).astype(np.uint32)
+        | np.uint32(1)
+    )[:, None]
+    b = rng.integers(0, 1 << 32, num_permutations, dtype=np.uint64).astype(np.uint32)[
+        :, None
+    ]
+
+    text_count = len(offsets) - 1
+    signatures = np.full(
+        (text_count, num_permutations), np.iinfo(np.uint32).max, dtype=np.uint32
+    )
+    with_shingles = offsets[1:] > offsets[:-1]
+    start = 0
+    while start < text_count:
+        # as many texts as fit in a chunk, at least one
+        end = int(
+            np.searchsorted(
+                offsets, offsets[start] + SIGNATURE_CHUNK_SHINGLES, side="right"
+            )
+        )
+        end = min(max(end - 1, start + 1), text_count)
+        chunk_texts = np.flatnonzero(with_shingles[start:end]) + start
+        if len(chunk_texts) > 0:
+            permuted = a * shingles[None, offsets[start] : offsets[end]]
+            permuted += b
+            signatures[chunk_texts] = np.minimum.reduceat(
+                permuted, offsets[chunk_texts] - offsets[start], axis=1
+            ).T
+        start = end
+    return signatures
+
+
+def find_clusters(
+    texts: List[str],
+    threshold: float = DEFAULT_THRESHOLD,
+    shingle_size: int = DEFAULT_SHINGLE_SIZE,
+    num_permutations: int = DEFAULT_NUM_PERMUTATIONS,
+    bands: int = DEFAULT_BANDS,
+) -> List[int]:
+    """
+    Clusters near-duplicate texts.
+
+    Every pair of texts sharing a bucket is compared, and joined if its estimated
+    similarity is at least threshold. Clusters are the connected texts.
+
+    Args:
+    texts (List[str]): The texts to cluster.
+    threshold (float): The estimated Jaccard similarity of the shingles of two texts
+    from which they are near-duplicates.
+    shingle_size (int): The number of words in a shingle.
+    num_permutations (int): The length of the signatures, a multiple of bands.
+    bands (int): The number of LSH bands.
+
+    Returns:
+    List[int]: The cluster of each text. Clusters are numbered in the order of their
+    first text, and texts without words are alone in their cluster.
+    """
+    assert num_permutations % bands == 0
+    rows = num_permutations // bands
+
+    shingles, offsets = get_shingles(texts, shingle_size)
+    # texts without words would all have the same signature
+    indices = np.flatnonzero(offsets[1:] > offsets[:-1])
+    # texts with the same signature, mostly the same text, are only bucketed once
+    signatures, signature_of_text = np.unique(
+        get_signatures(shingles, offsets, num_permutations)[indices],
+        axis=0,
+        return_inverse=True,
+    )
+    min_equal = math.ceil(threshold * num_permutations)
+
+    parents = list(range(len(signatures)))
+
+    def find(i: int) -> int:
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    for band in range(bands):
+        band_values = np.ascontiguousarray(
+            signatures[:, band * rows : (band + 1) * rows]
+        )
+        keys = band_values.view(np.dtype((np.void, rows * 4))).ravel()
+        _, buckets, bucket_sizes = np.unique(
+            keys, return_inverse=True, return_counts=True
+        )
+        shared = np.flatnonzero(bucket_sizes[buckets] > 1)
+        if len(shared) == 0:
+            continue
+        members = shared[np.argsort(buckets[shared], kind="stable")]
+        boundaries = np.flatnonzero(np.diff(buckets[members])) + 1
+        for bucket in np.split(members, boundaries):
+            bucket_signatures = signatures[bucket]
+            bucket_rows = bucket.tolist()
+            # every pair of the bucket, a block of rows at a time
+            for block_start in range(0, len(bucket), SIMILARITY_BLOCK_ROWS):
+                block = bucket_signatures[
+                    block_start : block_start + SIMILARITY_BLOCK_ROWS, None, :
+                ]
+                equal = np.count_nonzero(block == bucket_signatures[None], axis=2)
+                for i, j in zip(*np.nonzero(equal >= min_equal)):
+                    if j <= block_start + i:
+                        continue
+                    root = find(bucket_rows[block_start + i])
+                    other_root = find(bucket_rows[j])
+                    if root != other_root:
+                        parents[other_root] = root
+
+    roots = [find(row) for row in signature_of_text.ravel().tolist()]
+    root_of_text = dict(zip(indices.tolist(), roots))
+    cluster_ids: Dict[int, int] = {}
+    return [
+        # texts without words are keyed by their negative index
+        cluster_ids.setdefault(root_of_text.get(i, -1 - i), len(cluster_ids))
+        for i in range(len(texts))
+    ]
+
+
+def cluster_near_duplicates(
+    exams: Iterable[Exam | CompactExam],
+    threshold: float = DEFAULT_THRESHOLD,
+) -> List[List[QuestionReference]]:
+    """
+    Sets the duplicate_cluster metadata of every question of the exams, shared by the
+    questions whose filtered texts are near-duplicates, see find_clusters.
+
+    Args:
+    exams (Iterable[Exam | CompactExam]): Loaded exams, eg. the exams of a DataLoader.
+    threshold (float): The estimated similarity from which questions are
+    near-duplicates.
+
+    Returns:
+    List[List[QuestionReference]]: The clusters of more than one question, in the
+    order of their first question.
+    """
+    references: List[QuestionReference] = []
+    for exam in exams:
+        assert exam.loaded
+        for section in exam.sections or []:
+            for question in section.questions or []:
+                references.append(QuestionReference(exam, section, question))
+
+    cluster_ids = find_clusters(
+        [reference.question.filtered_text for reference in references], threshold
+    )
+    clusters: Dict[int, List[QuestionReference]] = {}
+    for reference, cluster_id in zip(references, cluster_ids):
+        reference.question.metadata.duplicate_cluster = cluster_id
+        clusters.setdefault(cluster_id, []).append(reference)
+    return [cluster for cluster in clusters.values() if len(cluster) > 1]
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Print the near-duplicate questions of parsed exams."
+    )
+    arg_parser.add_argument("inputs", nargs="+", help="_extracted.json files")
+    arg_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = arg_parser.parse_args()
+
+    duplicate_clusters = cluster_near_duplicates(
+        [Exam.read(input_file) for input_file in args.inputs], args.threshold
+    )
+    for cluster in duplicate_clusters:
+        print(f"Cluster {cluster[0].question.metadata.duplicate_cluster}:")
+        for exam, section, question in cluster:
+            print(
+                f"  {exam.exam_path} {exam.semester} {exam.year} {section.type} "
+                f"Q{question.question_number} {question.category}"
+            )
+    print(f"{len(duplicate_clusters)} clusters of near-duplicate questions")
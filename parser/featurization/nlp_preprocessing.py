@@ -0,0 +1,55 @@
+import argparse
+from typing import Dict, Iterable, Tuple
+
+import nltk
+
+from parser.dataset.exam import Exam
+from parser.model import NLTK_PACKAGES, NlpPipeline, get_nlp_pipeline
+
+
+def preprocess_exams(exams: Iterable[Exam], pipeline: NlpPipeline | None = None) -> int:
+    """
+    Fills the removed_stop_words and lemmatized_text metadata of every question of
+    the exams, preprocessing each distinct question text once.
+
+    Args:
+    exams (Iterable[Exam]): Loaded exams.
+    pipeline (NlpPipeline | None): Defaults to the pipeline shared by the process.
+
+    Returns:
+    int: The number of preprocessed questions.
+    """
+    if pipeline is None:
+        pipeline = get_nlp_pipeline()
+
+    preprocessed: Dict[str, Tuple[str, str]] = {}
+    count = 0
+    for exam in exams:
+        assert exam.loaded
+        for section in exam.sections or []:
+            for question in section.questions or []:
+                text = question.original_text
+                if text not in preprocessed:
+                    preprocessed[text] = pipeline.preprocess(text)
+                (
+                    question.metadata.removed_stop_words,
+                    question.metadata.lemmatized_text,
+                ) = preprocessed[text]
+                count += 1
+    return count
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Download the nltk data used by the NLP preprocessing."
+    )
+    sub_parsers = arg_parser.add_subparsers(dest="command", required=True)
+    download_parser = sub_parsers.add_parser("download")
+    download_parser.add_argument(
+        "data_dir", help="directory to pass as data_dir, or to set as $NLTK_DATA"
+    )
+    args = arg_parser.parse_args()
+
+    for package in NLTK_PACKAGES:
+        if not nltk.download(package, download_dir=args.data_dir):
+            raise SystemExit(f"Failed to download {package}")
@@ -1,15 +1,17 @@
+import re
 from enum import Enum, StrEnum
-from typing import List
+from functools import lru_cache
+from typing import List, Tuple
 
-from nltk import download as nltk_download
+import nltk
 from nltk.corpus import stopwords
 from nltk.stem import PorterStemmer
 from nltk.tokenize import word_tokenize
 from pydantic import BaseModel, Field
 
-NLTK_INITIALIZED: bool = False
-PORTER_STEMMER: PorterStemmer | None = None
-STOP_WORDS: set[str] | None = None
+NLTK_PACKAGES = ["stopwords", "punkt_tab"]
+DEFAULT_STEM_CACHE_SIZE = 1 << 16
+term_pattern = re.compile(r"[a-z0-9]+")
 
 
 class TextLocation(BaseModel, strict=True):
@@ -17,15 +19,64 @@ class TextLocation(BaseModel, strict=True):
     end_index: int
 
 
-def initialize_nltk():
-    nltk_download("stopwords")
-    nltk_download("punkt_tab")
-    global STOP_WORDS
-    STOP_WORDS = set(stopwords.words("english"))
-    global PORTER_STEMMER
-    PORTER_STEMMER = PorterStemmer()
-    global NLTK_INITIALIZED
-    NLTK_INITIALIZED = True
+class NlpPipeline:
+    """
+    Stop word removal and stemming backed by nltk data that is already on disk.
+
+    The stop words, the stemmer and the tokenizer are loaded once when the pipeline
+    is created, and stems are memoized in a bounded cache shared by every text.
+    """
+
+    def __init__(
+        self,
+        data_dir: str | None = None,
+        stem_cache_size: int = DEFAULT_STEM_CACHE_SIZE,
+    ):
+        # nltk only looks for data in nltk.data.path, which includes $NLTK_DATA, and
+        # never downloads it when loading
+        if data_dir is not None and data_dir not in nltk.data.path:
+            nltk.data.path.insert(0, data_dir)
+        try:
+            self.stop_words = frozenset(stopwords.words("english"))
+            word_tokenize("")
+        except LookupError as e:
+            raise LookupError(
+                f"Missing nltk data, download it once with: python -m "
+                f"parser.featurization.nlp_preprocessing download "
+                f"{data_dir or '<data dir>'}"
+            ) from e
+        self.stem = lru_cache(maxsize=stem_cache_size)(PorterStemmer().stem)
+
+    def preprocess(self, text: str) -> Tuple[str, str]:
+        """
+        Tokenizes text once and removes its stop words, then stems the remaining words.
+
+        Returns:
+        Tuple[str, str]: The text without stop words, and its stemmed words.
+        """
+        words = [word for word in word_tokenize(text) if word not in self.stop_words]
+        return " ".join(words), " ".join(self.stem(word) for word in words)
+
+    def terms(self, text: str) -> List[str]:
+        """
+        Stems the lowercase words of text that are not stop words. Faster than
+        preprocess as punctuation is skipped rather than tokenized, for search.
+        """
+        return [
+            self.stem(word)
+            for word in term_pattern.findall(text.lower())
+            if word not in self.stop_words
+        ]
+
+
+NLP_PIPELINE: NlpPipeline | None = None
+
+
+def get_nlp_pipeline() -> NlpPipeline:
+    global NLP_PIPELINE
+    if NLP_PIPELINE is None:
+        NLP_PIPELINE = NlpPipeline()
+    return NLP_PIPELINE
 
 
 class Semester(StrEnum):
@@ -112,6 +163,18 @@ class QuestionDescription(BaseModel, strict=True):
     )
 
 
+# Define the structure for query responses
+class QuestionNaming(BaseModel, strict=True):
+    chain_of_thought: str = Field(
+        ...,
+        description="The chain of thought that led to the prediction.",
+    )
+    name: str = Field(
+        ...,
+        description="The name of the question, following a leetcode naming convention.",
+    )
+
+
 class Text(BaseModel, strict=True):
     text: str
     location: TextLocation
@@ -138,11 +201,11 @@ class SubQuestion(BaseModel, strict=True):
     extracted_using_underscores: bool
     points: int | None = None
     classification: QuestionClassification | None = None
+    # filtered text of the matching sub-question of the solutions pdf
+    solution: str | None = None
 
 
 class Metadata(BaseModel, strict=True):
-    # original_text: str = Field(..., exclude=True)
-
     generated_name: str | None = None
     removed_stop_words: str | None = None
     lemmatized_text: str | None = None
@@ -150,37 +213,13 @@ class Metadata(BaseModel, strict=True):
     classification: QuestionClassification | None = None
     description: QuestionDescription | None = None
     classification_on_description: QuestionClassification | None = None
+    # shared by the near-duplicate questions of the exams clustered together
+    duplicate_cluster: int | None = None
 
-    def run_nlp_preprocessing(self):
-        self.removed_stop_words = self.remove_stop_words(self.original_text)
-        self.lemmatized_text = self.lemmatize_text(self.removed_stop_words)
-
-    def lemmatize_text(self, text: str) -> str:
-        if not NLTK_INITIALIZED:
-            initialize_nltk()
-        assert PORTER_STEMMER is not None
-
-        word_tokens = word_tokenize(text)
-        lemmatized_sentence = [PORTER_STEMMER.stem(word) for word in word_tokens]
-        return " ".join(lemmatized_sentence)
-
-    def remove_stop_words(self, text: str) -> str:
-        if not NLTK_INITIALIZED:
-            initialize_nltk()
-        assert STOP_WORDS is not None
-
-        word_tokens = word_tokenize(text)
-        # converts the words in word_tokens to lower case and then checks whether
-        # they are present in stop_words or not
-        filtered_sentence = [w for w in word_tokens if w.lower() not in STOP_WORDS]
-        # with no lower case conversion
-        filtered_sentence = []
-
-        for w in word_tokens:
-            if w not in STOP_WORDS:
-                filtered_sentence.append(w)
-
-        return " ".join(filtered_sentence)
+    def run_nlp_preprocessing(self, text: str, pipeline: NlpPipeline | None = None):
+        if pipeline is None:
+            pipeline = get_nlp_pipeline()
+        self.removed_stop_words, self.lemmatized_text = pipeline.preprocess(text)
 
 
 class Question(BaseModel, strict=True):
@@ -199,6 +238,8 @@ class Question(BaseModel, strict=True):
 
     sub_questions: List[SubQuestion]
     metadata: Metadata
+    # filtered text of the matching question of the solutions pdf
+    solution: str | None = None
 
 
 class Section(BaseModel, strict=True):
@@ -207,7 +248,8 @@ class Section(BaseModel, strict=True):
     end_page: int
 
     type: SectionType
-    pages: List[Page]
+    # left out of compact outputs
+    pages: List[Page] = []
     questions: List[Question] | None = None
 
 
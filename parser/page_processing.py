@@ -1,9 +1,31 @@
 import re
 from datetime import datetime
-from typing import Tuple
+from typing import Callable, NamedTuple, Tuple
 
 from parser.model import PageType, SectionType
 
+SECTION_PAGE_MARKER = "Computer Science Foundation Exam"
+# Searched in the text of a page without spaces, eg. "May22,2021"
+date_pattern = re.compile(r"\b([A-Za-z]+\d{1,2},\d{4})\b")
+section_info_pattern = re.compile(
+    r"Section\s+([A-D])(?:\s+|\n)(.*?)(?:\n|$)", re.DOTALL
+)
+pre_2022_section_info_pattern = re.compile(
+    r"Section\s+([I|I I]+)\s+([A-Z])\s*\n(.*?)(?:\n|$)", re.DOTALL
+)
+# Lower case section names, checked in order as "data structures" is contained in
+# "advanced data structures"
+SECTION_NAMES = [
+    ("Advanced Data Structures".lower(), SectionType.ADVANCED_DATA_STRUCTURES),
+    ("Data Structures".lower(), SectionType.BASIC_DATA_STRUCTURES),
+    ("Algorithm Analysis".lower(), SectionType.ALGORITHM_ANALYSIS),
+    ("Algorithms".lower(), SectionType.ALGORITHMS),
+]
+DEFAULT_HEAD_LINES = 8
+# Bump whenever a change to the page classification can change the type, section type
+# or date of a page, so that pages cached with the previous classification are not used
+PAGE_CLASSIFIER_VERSION = "1"
+
 
 def extract_date_from_page(text: str) -> datetime | None:
     # print("text: ", text)
@@ -16,7 +38,10 @@ def extract_date_from_page(text: str) -> datetime | None:
     Returns:
     datetime | None: The extracted date as a datetime object or None if no date is found.
     """
-    match = re.search(r"\b([A-Za-z]+\d{1,2},\d{4})\b", text.replace(" ", ""))
+    return parse_date(date_pattern.search(text.replace(" ", "")))
+
+
+def parse_date(match: re.Match[str] | None) -> datetime | None:
     if match:
         return datetime.strptime(match.group(0), "%B%d,%Y")
     return None
@@ -32,21 +57,26 @@ def extract_section_info(text: str) -> Tuple[str, str] | None:
     Returns:
     Tuple[str, str]: A tuple containing the section letter and section name.
     """
+    return get_section_info(lambda pattern: pattern.search(text))
+
+
+def get_section_info(
+    search: Callable[[re.Pattern[str]], re.Match[str] | None],
+) -> Tuple[str, str] | None:
+    # search finds the first match of a pattern in the text of the page
 
     # Looking for the following 2 lines:
     # Section A
     # BASIC DATA STRUCTURES
     # post 2022 exam regex
-    match = re.search(r"Section\s+([A-D])(?:\s+|\n)(.*?)(?:\n|$)", text, re.DOTALL)
+    match = search(section_info_pattern)
     if match is None:
         # print("unable to get section letter using Regex, must be pre 2022 Exam")
         # Looking for the following 2 lines:
         # Section I  A
         # DATA STRUCTURES
         # pre 2022 exam regex
-        match = re.search(
-            r"Section\s+([I|I I]+)\s+([A-Z])\s*\n(.*?)(?:\n|$)", text, re.DOTALL
-        )
+        match = search(pre_2022_section_info_pattern)
         # print("1", match)
         # print("initial match: ", match)
         if match:
@@ -79,14 +109,18 @@ def extract_section_info(text: str) -> Tuple[str, str] | None:
 
 
 def get_page_type(text: str) -> PageType | None:
-    if "Computer Science Foundation Exam" in text:
+    if SECTION_PAGE_MARKER in text:
         return PageType.SECTION
     return PageType.QUESTION
 
 
 def get_section_type(text: str) -> SectionType | None:
-    section_info = extract_section_info(text)
+    return get_section_type_from_info(extract_section_info(text))
 
+
+def get_section_type_from_info(
+    section_info: Tuple[str, str] | None,
+) -> SectionType | None:
     if section_info is None:
         print("unable to get section info")
         return None
@@ -95,14 +129,75 @@ def get_section_type(text: str) -> SectionType | None:
 
     section_name = " ".join(
         [x.strip() for x in section_name.split(" ") if x.strip() != ""]
-    )
-
-    if "Advanced Data Structures".lower() in section_name.lower():
-        return SectionType.ADVANCED_DATA_STRUCTURES
-    elif "Data Structures".lower() in section_name.lower():
-        return SectionType.BASIC_DATA_STRUCTURES
-    elif "Algorithm Analysis".lower() in section_name.lower():
-        return SectionType.ALGORITHM_ANALYSIS
-    elif "Algorithms".lower() in section_name.lower():
-        return SectionType.ALGORITHMS
+    ).lower()
+
+    for name, section_type in SECTION_NAMES:
+        if name in section_name:
+            return section_type
     return None
+
+
+class PageClassification(NamedTuple):
+    page_type: PageType
+    # None for question pages, and for section pages of an unknown section
+    section_type: SectionType | None
+    # only read when requested
+    date: datetime | None
+
+
+class PageClassifier:
+    """
+    Classifies pages with precompiled patterns.
+
+    The section info and the date are searched in the first head_lines lines of a
+    page, where they are printed. The rest of the page is only searched when the head
+    holds no match, or a match that reaches its end and so could continue past it,
+    which keeps the results the same as searching the whole page.
+    """
+
+    def __init__(self, head_lines: int = DEFAULT_HEAD_LINES):
+        self.head_lines = head_lines
+
+    def classify(self, text: str, read_date: bool = False) -> PageClassification:
+        head = self.get_head(text)
+
+        date: datetime | None = None
+        if read_date:
+            date = parse_date(self.search(date_pattern, text, head, strip_spaces=True))
+
+        if SECTION_PAGE_MARKER not in text:
+            return PageClassification(PageType.QUESTION, None, date)
+
+        section_type = get_section_type_from_info(
+            get_section_info(lambda pattern: self.search(pattern, text, head))
+        )
+        return PageClassification(PageType.SECTION, section_type, date)
+
+    def get_head(self, text: str) -> str:
+        # the first head_lines lines, with the newline ending the last of them
+        end = -1
+        for _ in range(self.head_lines):
+            end = text.find("\n", end + 1)
+            if end == -1:
+                return text
+        return text[: end + 1]
+
+    def search(
+        self,
+        pattern: re.Pattern[str],
+        text: str,
+        head: str,
+        strip_spaces: bool = False,
+    ) -> re.Match[str] | None:
+        # the head without spaces is the start of the text without spaces, so the
+        # spaces of the whole text are only removed when the head is not enough
+        searched_head = head.replace(" ", "") if strip_spaces else head
+        match = pattern.search(searched_head)
+        if len(head) == len(text) or (
+            match is not None and match.end() < len(searched_head)
+        ):
+            return match
+        return pattern.search(text.replace(" ", "") if strip_spaces else text)
+
+
+PAGE_CLASSIFIER = PageClassifier()
@@ -1,23 +1,114 @@
+import argparse
 import os
 import sys
-from typing import List
+from typing import List, TextIO
 
 from pydantic import BaseModel
 
-from parser.dataset.exam import Exam
+from parser.compact import load_compact_exam
+from parser.dataset.dataloader import (
+    ExamFailure,
+    get_exam_paths,
+    get_output_path,
+    ingest_exams,
+)
+from parser.dataset.exam import DEFAULT_PAGE_WORKERS, Exam, RecordType
+from parser.dataset.page_cache import PageCache
+from parser.dataset.solutions import get_solutions_path, try_load_solutions
 from parser.model import (
     Section,
 )
+from parser.profiling import ExamProfile, ProfileReport, profile_exam, stage
+from parser.text_extraction import DEFAULT_EXTRACTOR, EXTRACTORS
 
 
 class PreProcessedExam(BaseModel):
     sections: List[Section]
 
 
-def main(input_file: str, output_file: str, verbose: bool = False):
-    exam: Exam = Exam(input_file, None)
-    exam.load_data(verbose)
-    exam.write(output_file)
+def main(
+    input_file: str,
+    output_file: str,
+    verbose: bool = False,
+    extractor: str = DEFAULT_EXTRACTOR,
+    cache: PageCache | None = None,
+    compact: bool = False,
+    profile: bool = False,
+    page_workers: int = DEFAULT_PAGE_WORKERS,
+    streaming: bool = False,
+    solutions_path: str | None = None,
+) -> ExamProfile | None:
+    if compact and streaming:
+        raise ValueError("compact and streaming parses can't be combined")
+    if streaming and (cache is not None or page_workers != DEFAULT_PAGE_WORKERS):
+        # a streaming parse reads the pages in order, without the cache
+        raise ValueError("streaming parses use neither a page cache nor page workers")
+    with profile_exam(input_file, profile) as exam_profile:
+        if compact:
+            compact_exam = load_compact_exam(input_file, extractor, cache, page_workers)
+            if solutions_path is not None:
+                try_load_solutions(
+                    compact_exam, solutions_path, extractor, cache, page_workers
+                )
+            with stage("write"):
+                compact_exam.write(output_file)
+            return exam_profile
+
+        exam: Exam = Exam(input_file, None)
+        exam.load_data(
+            verbose,
+            extractor=extractor,
+            cache=cache,
+            page_workers=page_workers,
+            streaming=streaming,
+        )
+        if solutions_path is not None:
+            try_load_solutions(exam, solutions_path, extractor, cache, page_workers)
+        with stage("write"):
+            exam.write(output_file, include_pages=not streaming)
+        return exam_profile
+
+
+def stream_records(
+    exam_paths: List[str],
+    stream: TextIO,
+    record_type: RecordType = RecordType.QUESTION,
+    workers: int = 1,
+    extractor: str = DEFAULT_EXTRACTOR,
+    cache: PageCache | None = None,
+    compact: bool = False,
+    report: ProfileReport | None = None,
+    solutions_dir: str | None = None,
+) -> List[ExamFailure]:
+    """
+    Parses exams and writes one json line per question or section to stream as soon
+    as each exam is parsed. If a report is given, the profile of each exam is added
+    to it.
+
+    Returns:
+    List[ExamFailure]: The exams that could not be parsed.
+    """
+    failures: List[ExamFailure] = []
+    for result in ingest_exams(
+        exam_paths,
+        workers,
+        extractor,
+        cache,
+        write_output=False,
+        compact=compact,
+        profile=report is not None,
+        solutions_dir=solutions_dir,
+    ):
+        if report is not None and result.profile is not None:
+            report.exams.append(result.profile)
+        if isinstance(result, ExamFailure):
+            print(
+                f"Failed to parse {result.exam_path}: {result.error}", file=sys.stderr
+            )
+            failures.append(result)
+        else:
+            result.write_jsonl(stream, record_type)
+    return failures
 
 
 def write_to_file(filename: str, content: str):
@@ -34,17 +125,154 @@ def write_to_file(filename: str, content: str):
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python parse.py <input_file>", file=sys.stderr)
-        sys.exit(1)
+    arg_parser = argparse.ArgumentParser(description="Parse FE exam pdfs.")
+    arg_parser.add_argument(
+        "inputs", nargs="+", help="exam pdfs, or directories of exam pdfs"
+    )
+    arg_parser.add_argument(
+        "--extractor",
+        choices=list(EXTRACTORS),
+        default=DEFAULT_EXTRACTOR,
+        help="library used to extract the text of each page",
+    )
+    arg_parser.add_argument(
+        "--cache-dir",
+        help="directory caching the extracted pages of each pdf between runs, not "
+        "with --streaming",
+    )
+    arg_parser.add_argument(
+        "--solutions-dir",
+        help="directory of the solutions pdfs, named <exam>_solutions.pdf, whose "
+        "solutions are attached to the questions of their exam",
+    )
+    arg_parser.add_argument(
+        "--jsonl",
+        help="stream records to this file, or to stdout if '-', instead of writing "
+        "an _extracted.json per exam",
+    )
+    arg_parser.add_argument(
+        "--records",
+        choices=list(RecordType),
+        default=RecordType.QUESTION,
+        help="whether each jsonl record is a question or a section",
+    )
+    arg_parser.add_argument(
+        "--workers", type=int, default=1, help="number of exams parsed in parallel"
+    )
+    arg_parser.add_argument(
+        "--page-workers",
+        type=int,
+        default=DEFAULT_PAGE_WORKERS,
+        help="number of processes extracting and classifying the pages of the exam, "
+        "for very large pdfs, only used when parsing a single exam and not with "
+        "--streaming",
+    )
+    arg_parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="keep a single copy of the text of each section while parsing and leave "
+        "the pages out of the output",
+    )
+    arg_parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="split the pages into questions as they are read, without keeping them, "
+        "and leave the pages out of the output, only used when parsing a single exam "
+        "and not with --compact, --cache-dir or --page-workers",
+    )
+    arg_parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="print the time spent in each stage and the number of pages, questions "
+        "and regex bytes scanned for each exam to stderr",
+    )
+    args = arg_parser.parse_args()
+    if args.compact and args.streaming:
+        arg_parser.error("--compact and --streaming can't be combined")
+    if args.streaming and args.cache_dir:
+        arg_parser.error("--cache-dir and --streaming can't be combined")
+    if args.streaming and args.page_workers != DEFAULT_PAGE_WORKERS:
+        arg_parser.error("--page-workers and --streaming can't be combined")
 
-    input_file = sys.argv[1]
+    exam_paths: List[str] = []
+    for input_path in args.inputs:
+        if os.path.isdir(input_path):
+            exam_paths.extend(get_exam_paths(input_path))
+        else:
+            exam_paths.append(input_path)
 
-    output_file = (
-        os.path.dirname(input_file)
-        + "/"
-        + os.path.basename(input_file).removesuffix(".pdf")
-        + "_extracted.json"
-    )
+    cache = PageCache(args.cache_dir) if args.cache_dir else None
+    report = ProfileReport() if args.profile else None
+
+    if args.jsonl is None and len(exam_paths) == 1 and args.workers == 1:
+        exam_profile = main(
+            exam_paths[0],
+            get_output_path(exam_paths[0]),
+            extractor=args.extractor,
+            cache=cache,
+            compact=args.compact,
+            profile=args.profile,
+            page_workers=args.page_workers,
+            streaming=args.streaming,
+            solutions_path=get_solutions_path(args.solutions_dir, exam_paths[0]),
+        )
+        if exam_profile is not None:
+            print(ProfileReport(exams=[exam_profile]).format(), file=sys.stderr)
+        sys.exit(0)
+
+    if args.jsonl is None:
+        failures: List[ExamFailure] = []
+        for result in ingest_exams(
+            exam_paths,
+            args.workers,
+            args.extractor,
+            cache,
+            compact=args.compact,
+            profile=args.profile,
+            solutions_dir=args.solutions_dir,
+        ):
+            if report is not None and result.profile is not None:
+                report.exams.append(result.profile)
+            if isinstance(result, ExamFailure):
+                failures.append(result)
+        for failure in failures:
+            print(
+                f"Failed to parse {failure.exam_path}: {failure.error}",
+                file=sys.stderr,
+            )
+    elif args.jsonl == "-":
+        # keep the progress messages of the parser, and of its worker processes, out
+        # of the records by sending everything else written to stdout to stderr
+        records_stream = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+        sys.stdout.flush()
+        os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+        with records_stream:
+            failures = stream_records(
+                exam_paths,
+                records_stream,
+                RecordType(args.records),
+                args.workers,
+                args.extractor,
+                cache,
+                args.compact,
+                report,
+                args.solutions_dir,
+            )
+    else:
+        with open(args.jsonl, "w") as records_stream:
+            failures = stream_records(
+                exam_paths,
+                records_stream,
+                RecordType(args.records),
+                args.workers,
+                args.extractor,
+                cache,
+                args.compact,
+                report,
+                args.solutions_dir,
+            )
+
+    if report is not None:
+        print(report.format(), file=sys.stderr)
 
-    main(input_file, output_file)
+    sys.exit(1 if len(failures) > 0 else 0)
@@ -0,0 +1,160 @@
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import ContextManager, Dict, Iterable, Iterator, List, TypeVar
+
+from pydantic import BaseModel
+
+# Stages and counters are only recorded while an exam is being profiled, otherwise
+# each instrumentation point costs a context variable lookup.
+
+T = TypeVar("T")
+
+
+class ExamProfile(BaseModel, strict=True):
+    exam_path: str
+    # wall time in seconds spent in each stage, in the order the stages first ran
+    stages: Dict[str, float] = {}
+    pages: int = 0
+    sections: int = 0
+    questions: int = 0
+    sub_questions: int = 0
+    # length of the text handed to the page classification and question extraction
+    # regular expressions
+    regex_bytes_scanned: int = 0
+
+
+class ProfileReport(BaseModel, strict=True):
+    exams: List[ExamProfile] = []
+
+    def total(self) -> ExamProfile:
+        total = ExamProfile(exam_path="total")
+        for profile in self.exams:
+            for name, seconds in profile.stages.items():
+                total.stages[name] = total.stages.get(name, 0.0) + seconds
+            total.pages += profile.pages
+            total.sections += profile.sections
+            total.questions += profile.questions
+            total.sub_questions += profile.sub_questions
+            total.regex_bytes_scanned += profile.regex_bytes_scanned
+        return total
+
+    def format(self) -> str:
+        profiles = self.exams + [self.total()] if len(self.exams) > 1 else self.exams
+        stage_names: List[str] = []
+        for profile in profiles:
+            stage_names.extend(
+                name for name in profile.stages if name not in stage_names
+            )
+
+        lines: List[str] = []
+        for profile in profiles:
+            stages = ", ".join(
+                f"{name} {profile.stages.get(name, 0.0) * 1000:.1f}ms"
+                for name in stage_names
+            )
+            lines.append(
+                f"{profile.exam_path}: {stages} | {profile.pages} pages, "
+                f"{profile.sections} sections, {profile.questions} questions, "
+                f"{profile.sub_questions} sub-questions, "
+                f"{profile.regex_bytes_scanned} regex bytes scanned"
+            )
+        return "\n".join(lines)
+
+
+ACTIVE_PROFILE: ContextVar[ExamProfile | None] = ContextVar(
+    "ACTIVE_PROFILE", default=None
+)
+DISABLED_STAGE = nullcontext()
+
+
+@contextmanager
+def profile_exam(exam_path: str, enabled: bool = True) -> Iterator[ExamProfile | None]:
+    """
+    Records the stages and counters of everything run in the with block, in this
+    thread, into a new ExamProfile. Yields None and records nothing if not enabled.
+    """
+    if not enabled:
+        yield None
+        return
+
+    profile = ExamProfile(exam_path=exam_path)
+    token = ACTIVE_PROFILE.set(profile)
+    try:
+        yield profile
+    finally:
+        ACTIVE_PROFILE.reset(token)
+
+
+def stage(name: str) -> ContextManager:
+    profile = ACTIVE_PROFILE.get()
+    if profile is None:
+        return DISABLED_STAGE
+    return _time_stage(profile, name)
+
+
+@contextmanager
+def _time_stage(profile: ExamProfile, name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.stages[name] = (
+            profile.stages.get(name, 0.0) + time.perf_counter() - start
+        )
+
+
+def time_iterator(name: str, iterable: Iterable[T]) -> Iterable[T]:
+    """
+    Records the time spent producing each item of iterable, but not consuming it, as
+    the stage name.
+    """
+    profile = ACTIVE_PROFILE.get()
+    if profile is None:
+        return iterable
+    return _time_iterator(profile, name, iterable)
+
+
+def _time_iterator(
+    profile: ExamProfile, name: str, iterable: Iterable[T]
+) -> Iterator[T]:
+    iterator = iter(iterable)
+    while True:
+        with _time_stage(profile, name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def count_regex_bytes(length: int):
+    profile = ACTIVE_PROFILE.get()
+    if profile is not None:
+        profile.regex_bytes_scanned += length
+
+
+def count_sections(sections: Iterable):
+    """
+    Counts the sections, questions and sub-questions, at every depth, of Sections or
+    CompactSections.
+    """
+    profile = ACTIVE_PROFILE.get()
+    if profile is None:
+        return
+
+    sub_questions: List = []
+    for section in sections:
+        profile.sections += 1
+        for question in section.questions or []:
+            profile.questions += 1
+            sub_questions.extend(question.sub_questions)
+    while len(sub_questions) > 0:
+        profile.sub_questions += 1
+        sub_questions.extend(sub_questions.pop().sub_questions)
+
+
+def count_pages(pages: int):
+    profile = ACTIVE_PROFILE.get()
+    if profile is not None:
+        profile.pages += pages
@@ -1,11 +1,10 @@
 import re
 import sys
-from copy import copy
-from typing import Dict, List
+from bisect import bisect_right
+from typing import Dict, List, NamedTuple, Tuple
 
 from parser.model import (
     Metadata,
-    Page,
     PageType,
     Question,
     Section,
@@ -13,63 +12,142 @@ from parser.model import (
     SubQuestion,
     Text,
 )
+from parser.profiling import count_regex_bytes
 
-# Define the regex pattern to extract questions
-question_pattern = re.compile(
-    r"(?s)\s*([1-5])\)\s*\((\d+)\s*pts\)\s*(\w+)\s*\(\s*([^)]+?)\s*\)\s*(.*?)(?=\s*[1-5]\)\s*\(\d+\s*pts\)\s*\w+\s*\([^)]+\)|\s*\Z)",
-    re.DOTALL,
+# Matches the header of a question, eg. "1) (10 pts) DSN (Linked Lists)". The text of
+# a question is everything up to the next header.
+question_header_pattern = re.compile(
+    r"\s*([1-5])\)\s*\((\d+)\s*pts\)\s*(\w+)\s*\(\s*([^)]+?)\s*\)"
 )
 
-sub_question_pattern = re.compile(
-    r"(?m)^\s*(?:\(\s*([a-z])\s*\)|([a-z])\.|([a-z])\))\s*(?:\(\s*(\d+)\s*pts?\s*\))?\s*([\s\S]*?)(?=^\s*(?:\(\s*[a-z]\s*\)|[a-z]\.|[a-z]\))|\Z)",
-    re.DOTALL,
+# Written before the header of each question by the extractors that find the headers
+# from the position of their lines, see PageTextExtractor.marks_questions. A form feed
+# is whitespace, so the header pattern matches from it and it is never part of the
+# text of a question.
+QUESTION_MARK = "\f"
+
+# Matches the label of a sub-question at the start of a line, eg. "(a)", "a." or "a)".
+# The text of a sub-question is everything up to the next line starting with a label.
+sub_question_label_pattern = re.compile(
+    r"(?m)^[^\S\n]*(\(\s*([a-z])\s*\)|([a-z])\.|([a-z])\))"
+)
+# Matches a label at the start of the scanned text when it does not begin a line
+sub_question_leading_label_pattern = re.compile(
+    r"[^\S\n]*(\(\s*([a-z])\s*\)|([a-z])\.|([a-z])\))"
 )
+# Matches the optional points following a label, eg. "(5 pts)"
+sub_question_points_pattern = re.compile(r"\s*(?:\(\s*(\d+)\s*pts?\s*\))?\s*")
 
 
-def get_questions(section: Section) -> List[Question]:
-    questions: Dict[int, Question] = {}
+class QuestionSegment(NamedTuple):
+    header: re.Match[str]
 
-    for i, page in enumerate(section.pages):
-        assert page.page_type == PageType.QUESTION
+    # bounds of the question text, without the header and the surrounding whitespace
+    start: int
+    end: int
 
-        next: Page | None = section.pages[i + 1] if i + 1 < len(section.pages) else None
 
-        next_plus_current = apply_header_filter(page.text) + (
-            "\n" + apply_header_filter(next.text) if next is not None else ""
-        )
-
-        # Find all matches in the combined text of the current and next page
+def get_questions(
+    section: Section, filter_headers: bool = True, marked: bool = False
+) -> List[Question]:
+    text, page_offsets = get_section_text(section, filter_headers)
 
-        current_questions: List[Question] = extract_questions(
-            apply_header_filter(page.text), section.type
-        )
-        next_plus_current_questions: List[Question] = extract_questions(
-            next_plus_current, section.type
+    questions: Dict[int, Question] = {}
+    for segment in segment_questions(text, marked):
+        question = build_question(text, segment, section.type)
+        question.pages = get_segment_pages(
+            get_page_numbers(section), page_offsets, segment
         )
-
-        for question in current_questions:
-            question.pages.append(i + section.start_page)
-            questions[question.question_number] = question
-
-        for question in next_plus_current_questions:
-            if question.question_number in questions:
-                # this means that the question spanned multiple pages and the text spanning both pages should be updated
-
-                if (
-                    questions[question.question_number].filtered_text
-                    != question.filtered_text
-                ):
-                    questions[
-                        question.question_number
-                    ].filtered_text = question.filtered_text
-                    assert next is not None
-                    questions[question.question_number].pages.append(
-                        i + section.start_page + 1
-                    )
+        questions[question.question_number] = question
 
     return sorted(questions.values(), key=lambda q: q.question_number)
 
 
+def get_section_text(
+    section: Section, filter_headers: bool = True
+) -> Tuple[str, List[int]]:
+    """
+    Joins the header filtered text of every page of a section.
+
+    Args:
+    section (Section): The section to join the pages of.
+    filter_headers (bool): Whether to apply the header filter, False when the pages
+    were extracted without their headers.
+
+    Returns:
+    Tuple[str, List[int]]: The text of the section, and the offset in it at which
+    each page starts.
+    """
+    page_texts: List[str] = []
+    page_offsets: List[int] = []
+    offset = 0
+    for page in section.pages:
+        assert page.page_type == PageType.QUESTION
+        page_text = apply_header_filter(page.text) if filter_headers else page.text
+        page_texts.append(page_text)
+        page_offsets.append(offset)
+        offset += len(page_text) + 1  # +1 for the newline joining the pages
+
+    return "\n".join(page_texts), page_offsets
+
+
+def get_page_numbers(section: Section) -> List[int]:
+    return [page.page_number for page in section.pages]
+
+
+def get_segment_pages(
+    page_numbers: List[int],
+    page_offsets: List[int],
+    segment: QuestionSegment,
+    base: int = 0,
+) -> List[int]:
+    # a question spans every page from its header to the end of its text. base is the
+    # offset in the section text of the text the segment was found in
+    question_start = base + segment.header.start(1)
+    question_end = base + max(segment.end - 1, segment.header.start(1))
+    first_page = bisect_right(page_offsets, question_start) - 1
+    last_page = bisect_right(page_offsets, question_end) - 1
+    return page_numbers[first_page : last_page + 1]
+
+
+def segment_questions(text: str, marked: bool = False) -> List[QuestionSegment]:
+    """
+    Splits text into questions in a single scan over the question headers.
+
+    Args:
+    text (str): The text to split.
+    marked (bool): Whether the headers are preceded by QUESTION_MARK, in which case
+    only the marks are searched for and the header pattern only parses the header
+    at each of them.
+
+    Returns:
+    List[QuestionSegment]: The header and text bounds of each question, in order.
+    """
+    headers: List[re.Match[str]] = []
+    if marked:
+        mark = text.find(QUESTION_MARK)
+        while mark != -1:
+            header = question_header_pattern.match(text, mark)
+            if header is not None:
+                headers.append(header)
+            mark = text.find(QUESTION_MARK, mark + 1)
+    else:
+        count_regex_bytes(len(text))
+        headers.extend(question_header_pattern.finditer(text))
+
+    segments: List[QuestionSegment] = []
+    for i, header in enumerate(headers):
+        start = header.end()
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(text)
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        segments.append(QuestionSegment(header=header, start=start, end=end))
+
+    return segments
+
+
 def write_to_file(filename: str, content: str):
     try:
         with open(filename, "w") as file:
@@ -104,66 +182,100 @@ def apply_header_filter(text: str) -> str:
 
 
 def extract_questions(text: str, section_type: SectionType) -> List[Question]:
-    questions: List[Question] = []
-    matches = question_pattern.findall(text)
-
-    for match in matches:
-        question_number, max_points, category, sub_category, question_text = match
-
-        original_text = question_text
-        sub_questions = extract_sub_questions(question_text)
-        for sub_question in sub_questions:
-            question_text = question_text.replace(
-                sub_question.original_text.text, ""
-            ).strip()
-
-        question = Question(
-            pages=[],
-            section_type=section_type,
-            question_number=int(question_number),
-            max_points=int(max_points),
-            category=category,
-            sub_category=sub_category,
-            filtered_text=question_text,
-            original_text=original_text,
-            sub_questions=sub_questions,
-            metadata=Metadata(),
-        )
+    return [
+        build_question(text, segment, section_type)
+        for segment in segment_questions(text)
+    ]
+
+
+def build_question(
+    text: str, segment: QuestionSegment, section_type: SectionType
+) -> Question:
+    question_number, max_points, category, sub_category = segment.header.groups()
+    question_text = text[segment.start : segment.end]
+
+    original_text = question_text
+    sub_questions = [
+        build_sub_question(text, span, segment.start)
+        for span in scan_sub_questions(text, segment.start, segment.end)
+    ]
+    question_text = remove_sub_question_texts(
+        question_text,
+        [sub_question.original_text.text for sub_question in sub_questions],
+    )
+
+    return Question(
+        pages=[],
+        section_type=section_type,
+        question_number=int(question_number),
+        max_points=int(max_points),
+        category=category,
+        sub_category=sub_category,
+        filtered_text=question_text,
+        original_text=original_text,
+        sub_questions=sub_questions,
+        metadata=Metadata(),
+    )
+
+
+class SubQuestionSpan(NamedTuple):
+    identifier: str
+    points: int | None
+
+    # bounds of the sub-question, including its label, in the scanned text
+    start: int
+    end: int
+
+    # bounds of the sub-question text, without its label and points
+    text_start: int
+    text_end: int
+
+    sub_questions: List["SubQuestionSpan"]
+    extracted_using_underscores: bool
+
+
+def remove_sub_question_texts(text: str, sub_question_texts: List[str]) -> str:
+    for sub_question_text in sub_question_texts:
+        text = text.replace(sub_question_text, "").strip()
+    return text
 
-        questions.append(question)
 
-    return questions
+def extract_fill_in_the_blank_sub_questions(text: str) -> List[SubQuestion]:
+    return [
+        build_sub_question(text, span, 0)
+        for span in scan_fill_in_the_blanks(text, 0, len(text))
+    ]
 
 
-def extract_fill_in_the_blank_sub_questions(text: str) -> List[SubQuestion]:
-    text_lines = text.split("\n")
-    sub_questions: List[SubQuestion] = []
+def scan_fill_in_the_blanks(text: str, start: int, end: int) -> List[SubQuestionSpan]:
+    sub_questions: List[SubQuestionSpan] = []
 
-    current_index_in_master_text = 0
-    for line in text_lines:
-        # max_index_in_master_text = current_index_in_master_text + len(line)
+    line_start = start
+    while line_start <= end:
+        line_end = text.find("\n", line_start, end)
+        if line_end == -1:
+            line_end = end
 
-        line_without_whitespace = line.replace(" ", "")
+        line_without_whitespace = text[line_start:line_end].replace(" ", "")
         if "_____" in line_without_whitespace and (
             "=" in line_without_whitespace
             or ":" in line_without_whitespace
             or ";" in line_without_whitespace
         ):
-            sub_question = SubQuestion(
-                identifier="",
-                points=None,
-                original_text=Text.from_string(
-                    line, line, current_index_in_master_text
-                ),
-                filtered_text=Text.from_string(
-                    line, line, current_index_in_master_text
-                ),
-                sub_questions=[],
-                extracted_using_underscores=True,
+            sub_questions.append(
+                SubQuestionSpan(
+                    identifier="",
+                    points=None,
+                    start=line_start,
+                    end=line_end,
+                    text_start=line_start,
+                    text_end=line_end,
+                    sub_questions=[],
+                    extracted_using_underscores=True,
+                )
             )
-            sub_questions.append(sub_question)
 
-        current_index_in_master_text += len(line) + 1  # +1 for the newline character
+        line_start = line_end + 1  # +1 for the newline character
 
     return sub_questions
 
@@ -180,70 +292,163 @@ def is_outlier_sub_question(msg: str) -> bool:
 
 
 def extract_sub_questions(text: str) -> List[SubQuestion]:
-    matches = sub_question_pattern.finditer(text)  # Use finditer to get match objects
-
-    sub_questions: List[SubQuestion] = []
-
-    for match in matches:
-        # Extract the entire matched string
-        original_text = match.group(0)
+    return [
+        build_sub_question(text, span, 0)
+        for span in scan_sub_questions(text, 0, len(text))
+    ]
+
+
+def build_sub_question(text: str, span: SubQuestionSpan, base: int) -> SubQuestion:
+    """
+    Materializes a scanned sub-question.
+
+    Args:
+    text (str): The text the sub-question was scanned from.
+    span (SubQuestionSpan): The scanned sub-question.
+    base (int): Offset in text of the text the sub-question locations are relative to.
+
+    Returns:
+    SubQuestion: The sub-question and its nested sub-questions.
+    """
+    original_text = text[span.start : span.end]
+    question_text = text[span.text_start : span.text_end]
+
+    sub_questions = [
+        build_sub_question(text, sub_span, span.text_start)
+        for sub_span in span.sub_questions
+    ]
+
+    filtered_text = question_text
+    if len(sub_questions) > 0:
+        # only the last nested sub-question is removed from the text
+        filtered_text = remove_sub_question_texts(
+            question_text, [sub_questions[-1].original_text.text]
+        )
 
-        if is_outlier_sub_question(original_text):
-            print(f"Skipping outlier sub-question: {original_text}")
+    return SubQuestion(
+        identifier=span.identifier,
+        points=span.points,
+        filtered_text=Text.from_string(filtered_text, original_text, span.start - base),
+        original_text=Text.from_string(original_text, original_text, span.start - base),
+        sub_questions=sub_questions,
+        extracted_using_underscores=span.extracted_using_underscores,
+    )
+
+
+def scan_sub_questions(
+    text: str, start: int, end: int, nested: bool = False
+) -> List[SubQuestionSpan]:
+    """
+    Finds the labelled sub-questions of text[start:end] in a single scan, falling
+    back to fill in the blank sub-questions when there are none. start is treated as
+    the start of a line.
+
+    A sub-question starts at a line whose first non whitespace characters are a label,
+    along with the whitespace only lines preceding it, and ends where the next one
+    starts. A label that is not at the start of a line is part of the text of the
+    sub-question before it.
+
+    Args:
+    text (str): The text to scan.
+    start (int): Offset in text at which to start scanning.
+    end (int): Offset in text at which to stop scanning.
+    nested (bool): Whether text[start:end] is the text of a sub-question. A label can
+    then only appear at start, as any other would have ended the parent sub-question.
+
+    Returns:
+    List[SubQuestionSpan]: The sub-questions, in order.
+    """
+    labels: List[re.Match[str]] = []
+    if nested or (start > 0 and text[start - 1] != "\n"):
+        leading_label = sub_question_leading_label_pattern.match(text, start, end)
+        if leading_label is not None:
+            labels.append(leading_label)
+    if not nested:
+        count_regex_bytes(end - start)
+        labels.extend(sub_question_label_pattern.finditer(text, start, end))
+
+    sub_questions: List[SubQuestionSpan] = []
+    position = start
+    i = 0
+    while True:
+        sub_question_start: int | None = None
+        while i < len(labels):
+            sub_question_start = _get_label_line_start(text, start, labels[i], position)
+            if sub_question_start is not None:
+                break
+            i += 1
+        if sub_question_start is None:
+            break
+
+        label = labels[i]
+        points = sub_question_points_pattern.match(text, label.end(), end)
+        assert points is not None
+        text_start = points.end()
+
+        # the sub-question ends at the first label line starting after its label
+        sub_question_end = end
+        i += 1
+        while i < len(labels):
+            next_start = _get_label_line_start(text, start, labels[i], text_start)
+            if next_start is not None:
+                sub_question_end = next_start
+                break
+            i += 1
+        position = sub_question_end
+
+        if is_outlier_sub_question(text[sub_question_start:sub_question_end]):
+            print(
+                "Skipping outlier sub-question: "
+                f"{text[sub_question_start:sub_question_end]}"
+            )
             continue
 
-        question_text: str
-        letter: str
-        letter_alt: str
-        letter_alt2: str
-        points: str
-
-        letter, letter_alt, letter_alt2, points, question_text = match.groups()
-        assert (
-            sum(x is not None and x != "" for x in [letter, letter_alt, letter_alt2])
-            == 1
-        ), f"Only one of letter, letter_alt, and letter_alt2 should be not None. letter='{letter}', letter_alt='{letter_alt}', letter_alt2='{letter_alt2}'"
-
-        letter = letter if letter else letter_alt
-        letter = letter if letter else letter_alt2
-
-        question_text = question_text.strip()
+        text_end = sub_question_end
+        while text_end > text_start and text[text_end - 1].isspace():
+            text_end -= 1
 
         # Beginning of manual edge-case handling
         # Page 8
-        if question_text.startswith("(b) "):
-            question_text = question_text[3:]
+        if text.startswith("(b) ", text_start, text_end):
+            text_start += 3
 
         # End of manual edge-case handling
 
-        sub_questions_in_sub_question = extract_sub_questions(question_text)
+        sub_questions_in_sub_question = scan_sub_questions(
+            text, text_start, text_end, nested=True
+        )
 
-        if len(sub_questions_in_sub_question) == 0:
-            sub_questions_in_sub_question = extract_fill_in_the_blank_sub_questions(
-                question_text
+        sub_questions.append(
+            SubQuestionSpan(
+                identifier=label.group(2) or label.group(3) or label.group(4),
+                points=int(points.group(1)) if points.group(1) else None,
+                start=sub_question_start,
+                end=sub_question_end,
+                text_start=text_start,
+                text_end=text_end,
+                sub_questions=sub_questions_in_sub_question,
+                extracted_using_underscores=False,
             )
-
-        filtered_text = copy(question_text)
-        for sub_question in sub_questions_in_sub_question:
-            filtered_text = question_text.replace(
-                sub_question.original_text.text, ""
-            ).strip()
-
-        sub_question = SubQuestion(
-            identifier=letter,
-            points=int(points) if points else None,
-            filtered_text=Text.from_string(
-                filtered_text, original_text, text.find(original_text)
-            ),
-            original_text=Text.from_string(
-                original_text, original_text, text.find(original_text)
-            ),
-            sub_questions=sub_questions_in_sub_question,
-            extracted_using_underscores=False,
         )
-        sub_questions.append(sub_question)
 
     if len(sub_questions) == 0:
-        sub_questions = extract_fill_in_the_blank_sub_questions(text)
+        sub_questions = scan_fill_in_the_blanks(text, start, end)
 
     return sub_questions
+
+
+def _get_label_line_start(
+    text: str, start: int, label: re.Match[str], position: int
+) -> int | None:
+    # A sub-question includes the whitespace only lines before its label, so it
+    # starts at the first line start at or after position from which there is only
+    # whitespace up to the label. None if there is no such line start.
+    line_start = label.start()
+    if line_start < position:
+        return None
+
+    while line_start > position and text[line_start - 1].isspace():
+        line_start -= 1
+    if line_start == start or text[line_start - 1] == "\n":
+        return line_start
+    return text.index("\n", line_start) + 1
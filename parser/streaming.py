@@ -0,0 +1,169 @@
+from typing import Dict, Iterable, Iterator, List
+
+from parser.model import Page, PageType, Question, Section, SectionType
+from parser.profiling import stage
+from parser.question_extraction import (
+    QuestionSegment,
+    apply_header_filter,
+    build_question,
+    get_segment_pages,
+    segment_questions,
+)
+
+# Splits the pages of an exam into sections and questions as the pages are read,
+# instead of once every page is. The text of a question ends at the next question
+# header, so once a header is found every question before it is complete. Only the
+# text of the section from the last header found on is kept, which is the page of the
+# open question and the page being read, unless a question spans more pages.
+#
+# A header can't run into the text after the end of the window: a match starting
+# before the last header found would stop at the ")" of that header, so the headers
+# found in the window are the headers found in the whole section text.
+
+
+class SectionStream:
+    """
+    Builds the questions of a section from its pages, one page at a time.
+    """
+
+    def __init__(
+        self,
+        section_type: SectionType,
+        keep_questions: bool = True,
+        filter_headers: bool = True,
+        marked: bool = False,
+    ):
+        self.section_type = section_type
+        self.keep_questions = keep_questions
+        self.filter_headers = filter_headers
+        # whether the question headers are preceded by QUESTION_MARK
+        self.marked = marked
+
+        # the page number and the offset in the section text of each page
+        self.page_numbers: List[int] = []
+        self.page_offsets: List[int] = []
+        # the section text from window_offset on
+        self.window = ""
+        self.window_offset = 0
+        # the last question of each number, as get_questions keeps them
+        self.questions: Dict[int, Question] = {}
+
+    def add_page(self, page: Page) -> List[Question]:
+        """
+        Adds the next page of the section.
+
+        Args:
+        page (Page): The next question page of the section.
+
+        Returns:
+        List[Question]: The questions completed by the page, in order.
+        """
+        assert page.page_type == PageType.QUESTION
+        page_text = page.text
+        if self.filter_headers:
+            page_text = apply_header_filter(page_text)
+        if len(self.page_numbers) > 0:
+            self.window += "\n"
+        self.page_numbers.append(page.page_number)
+        self.page_offsets.append(self.window_offset + len(self.window))
+        self.window += page_text
+
+        segments = segment_questions(self.window, self.marked)
+        if len(segments) == 0:
+            return []
+
+        # the last question may go on on the next page
+        completed = self.build_questions(segments[:-1])
+        cut = segments[-1].header.start()
+        self.window = self.window[cut:]
+        self.window_offset += cut
+        return completed
+
+    def finish(self) -> List[Question]:
+        """
+        Ends the section.
+
+        Returns:
+        List[Question]: The questions completed by the end of the section, in order.
+        """
+        if len(self.page_numbers) == 0:
+            raise ValueError(f"No pages found in the {self.section_type} section")
+        completed = self.build_questions(segment_questions(self.window, self.marked))
+        self.window = ""
+        return completed
+
+    def build_questions(self, segments: List[QuestionSegment]) -> List[Question]:
+        questions: List[Question] = []
+        for segment in segments:
+            question = build_question(self.window, segment, self.section_type)
+            question.pages = get_segment_pages(
+                self.page_numbers, self.page_offsets, segment, self.window_offset
+            )
+            if self.keep_questions:
+                self.questions[question.question_number] = question
+            questions.append(question)
+        return questions
+
+    def to_section(self) -> Section:
+        return Section(
+            type=self.section_type,
+            start_page=self.page_numbers[0],
+            end_page=self.page_numbers[-1],
+            questions=(
+                sorted(self.questions.values(), key=lambda q: q.question_number)
+                if self.keep_questions
+                else None
+            ),
+        )
+
+
+def stream_questions(
+    pages: Iterable[Page],
+    keep_questions: bool = True,
+    filter_headers: bool = True,
+    marked: bool = False,
+) -> Iterator[Question | Section]:
+    """
+    Yields each question of the pages of an exam as soon as its last page is read, and
+    each section, without its pages, once its questions are.
+
+    Questions are yielded in the order they appear. A section keeps the last question
+    of each number, sorted by number, as get_questions does.
+
+    Args:
+    pages (Iterable[Page]): The pages of the exam, in page order.
+    keep_questions (bool): Whether each section holds its questions. Without them, a
+    section holds no text and memory no longer grows with the size of the exam.
+    filter_headers (bool): Whether to apply the header filter, False when the pages
+    were extracted without their headers.
+    marked (bool): Whether the question headers are preceded by QUESTION_MARK.
+
+    Returns:
+    Iterator[Question | Section]: The questions and sections of the exam.
+    """
+    section_stream: SectionStream | None = None
+    for page in pages:
+        if page.page_type == PageType.SECTION:
+            if section_stream is not None:
+                yield from finish_section(section_stream)
+            section_stream = SectionStream(
+                page.section_type, keep_questions, filter_headers, marked
+            )
+        else:
+            assert section_stream is not None
+            with stage("get_questions"):
+                completed = section_stream.add_page(page)
+            yield from completed
+
+    if section_stream is None:
+        raise ValueError("No sections found")
+
+    yield from finish_section(section_stream)
+
+
+def finish_section(section_stream: SectionStream) -> Iterator[Question | Section]:
+    with stage("get_questions"):
+        completed = section_stream.finish()
+        section = section_stream.to_section()
+    yield from completed
+    yield section
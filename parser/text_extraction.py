@@ -0,0 +1,246 @@
+import io
+import itertools
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, NamedTuple, Type
+
+import pymupdf
+import pypdf
+
+from parser.question_extraction import QUESTION_MARK, question_header_pattern
+
+# the path of a pdf, or its contents
+PdfSource = str | bytes
+
+# fraction of the height of a page, at its top and at its bottom, holding the header
+# and the footer
+DEFAULT_LAYOUT_MARGIN = 0.07
+# distance, in points, from the left margin of a page within which a line starts at it
+LEFT_MARGIN_TOLERANCE = 2.0
+# Bump whenever a change to get_layout_text can change the text of a page, so that
+# pages cached with the previous text are not used
+LAYOUT_TEXT_VERSION = "2"
+
+
+class PageTextExtractor(ABC):
+    name: str
+    # whether the pages are extracted without their headers and footers, which the
+    # line based header filter of the question extraction then leaves alone
+    strips_headers = False
+    # whether the header of each question is preceded by QUESTION_MARK, placed from the
+    # position of its line, so that questions are split at the marks instead of
+    # wherever the question header pattern matches the text
+    marks_questions = False
+
+    @property
+    def version(self) -> str:
+        # identifies the extractor output, changes whenever the backing library does
+        return f"{self.name}-{self.library_version()}"
+
+    @abstractmethod
+    def library_version(self) -> str:
+        pass
+
+    @abstractmethod
+    def extract_pages(self, pdf: PdfSource) -> Iterator[str]:
+        """
+        Extracts the text of every page in the pdf, in page order.
+
+        Args:
+        pdf (PdfSource): The path of the pdf to read, or its contents.
+
+        Returns:
+        Iterator[str]: The text of each page.
+        """
+        pass
+
+    def count_pages(self, pdf: PdfSource) -> int:
+        # extractors backed by a library override this to not extract any text
+        return sum(1 for _ in self.extract_pages(pdf))
+
+    def extract_page_range(self, pdf: PdfSource, start: int, end: int) -> Iterator[str]:
+        """
+        Extracts the text of the pages from start up to, but not including, end.
+        """
+        return itertools.islice(self.extract_pages(pdf), start, end)
+
+
+class PypdfExtractor(PageTextExtractor):
+    name = "pypdf"
+
+    def library_version(self) -> str:
+        return pypdf.__version__
+
+    def extract_pages(self, pdf: PdfSource) -> Iterator[str]:
+        reader = self.get_reader(pdf)
+        for page in reader.pages:
+            yield page.extract_text()
+
+    def count_pages(self, pdf: PdfSource) -> int:
+        return len(self.get_reader(pdf).pages)
+
+    def extract_page_range(self, pdf: PdfSource, start: int, end: int) -> Iterator[str]:
+        reader = self.get_reader(pdf)
+        for page in reader.pages[start:end]:
+            yield page.extract_text()
+
+    def get_reader(self, pdf: PdfSource) -> pypdf.PdfReader:
+        return pypdf.PdfReader(io.BytesIO(pdf) if isinstance(pdf, bytes) else pdf)
+
+
+class PyMuPDFExtractor(PageTextExtractor):
+    name = "pymupdf"
+
+    def library_version(self) -> str:
+        return pymupdf.VersionBind
+
+    def extract_pages(self, pdf: PdfSource) -> Iterator[str]:
+        with self.open(pdf) as document:
+            for page in document:
+                yield self.get_page_text(page)
+
+    def count_pages(self, pdf: PdfSource) -> int:
+        with self.open(pdf) as document:
+            return document.page_count
+
+    def extract_page_range(self, pdf: PdfSource, start: int, end: int) -> Iterator[str]:
+        with self.open(pdf) as document:
+            for page_number in range(start, min(end, document.page_count)):
+                yield self.get_page_text(document[page_number])
+
+    def get_page_text(self, page: pymupdf.Page) -> str:
+        # pymupdf terminates every line with a newline, pypdf does not terminate the
+        # last one
+        return page.get_text().removesuffix("\n")
+
+    def open(self, pdf: PdfSource) -> pymupdf.Document:
+        if isinstance(pdf, bytes):
+            return pymupdf.open(stream=pdf, filetype="pdf")
+        return pymupdf.open(pdf)
+
+
+class TextLine(NamedTuple):
+    text: str
+    # bounding box, in points from the top left corner of the page
+    x0: float
+    y0: float
+    x1: float
+    y1: float
+
+
+class TextBlock(NamedTuple):
+    x0: float
+    y0: float
+    x1: float
+    y1: float
+    lines: List[TextLine]
+
+
+class PageLayout(NamedTuple):
+    width: float
+    height: float
+    # in the order they are drawn, which is the reading order of FE exams
+    blocks: List[TextBlock]
+
+
+class PyMuPDFLayoutExtractor(PyMuPDFExtractor):
+    """
+    Extracts the text blocks of each page with their bounding boxes, and builds the
+    text of the page from them in a single pass: the blocks lying in the top or
+    bottom margin of the page are dropped as its header and footer, whatever their
+    text, a block starting at the left margin with a question header starts a
+    question and is marked, and the vertical space between two lines, such as the
+    space left for an answer, becomes one blank line per line height.
+    """
+
+    name = "pymupdf-layout"
+    strips_headers = True
+    marks_questions = True
+
+    def __init__(self, margin: float = DEFAULT_LAYOUT_MARGIN):
+        self.margin = margin
+
+    @property
+    def version(self) -> str:
+        return f"{super().version}-{self.margin}-{LAYOUT_TEXT_VERSION}"
+
+    def extract_layouts(self, pdf: PdfSource) -> Iterator[PageLayout]:
+        with self.open(pdf) as document:
+            for page in document:
+                yield get_page_layout(page)
+
+    def get_page_text(self, page: pymupdf.Page) -> str:
+        return get_layout_text(get_page_layout(page), self.margin)
+
+
+def get_page_layout(page: pymupdf.Page) -> PageLayout:
+    blocks: List[TextBlock] = []
+    # TEXTFLAGS_TEXT leaves out images, which have no text
+    for block in page.get_text("dict", flags=pymupdf.TEXTFLAGS_TEXT)["blocks"]:
+        lines = [
+            TextLine("".join(span["text"] for span in line["spans"]), *line["bbox"])
+            for line in block["lines"]
+        ]
+        blocks.append(TextBlock(*block["bbox"], lines))
+    return PageLayout(page.rect.width, page.rect.height, blocks)
+
+
+def get_layout_text(layout: PageLayout, margin: float = DEFAULT_LAYOUT_MARGIN) -> str:
+    """
+    Joins the lines of the blocks of a page outside of its top and bottom margins.
+
+    A question starts at the first line of a block, at the left margin of the page,
+    that is a question header. That line is preceded by QUESTION_MARK, so a header
+    quoted inside a block or an indented one does not split the question it is in.
+
+    Args:
+    layout (PageLayout): The blocks of the page.
+    margin (float): The fraction of the height of the page, at its top and at its
+    bottom, in which blocks are dropped.
+
+    Returns:
+    str: The text of the page, with a blank line for each line height of vertical
+    space between two lines.
+    """
+    top = layout.height * margin
+    bottom = layout.height * (1 - margin)
+    blocks = [block for block in layout.blocks if block.y1 > top and block.y0 < bottom]
+    left = min((block.x0 for block in blocks), default=0.0)
+    texts: List[str] = []
+    previous: TextLine | None = None
+    for block in blocks:
+        for line in block.lines:
+            if previous is not None and previous.y1 > previous.y0:
+                # lines on the same row, or overlapping, are 0 or less apart
+                blank_lines = round(
+                    (line.y0 - previous.y1) / (previous.y1 - previous.y0)
+                )
+                texts.extend([""] * blank_lines)
+            if (
+                line is block.lines[0]
+                and line.x0 - left <= LEFT_MARGIN_TOLERANCE
+                and question_header_pattern.match(line.text) is not None
+            ):
+                texts.append(QUESTION_MARK + line.text)
+            else:
+                texts.append(line.text)
+            previous = line
+    return "\n".join(texts)
+
+
+EXTRACTORS: Dict[str, Type[PageTextExtractor]] = {
+    PypdfExtractor.name: PypdfExtractor,
+    PyMuPDFExtractor.name: PyMuPDFExtractor,
+    PyMuPDFLayoutExtractor.name: PyMuPDFLayoutExtractor,
+}
+
+DEFAULT_EXTRACTOR = PypdfExtractor.name
+
+
+def get_extractor(extractor: str | PageTextExtractor) -> PageTextExtractor:
+    if isinstance(extractor, PageTextExtractor):
+        return extractor
+    if extractor not in EXTRACTORS:
+        raise ValueError(
+            f"Unknown extractor '{extractor}', expected one of {list(EXTRACTORS)}"
+        )
+    return EXTRACTORS[extractor]()
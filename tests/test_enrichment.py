@@ -0,0 +1,209 @@
+import threading
+from typing import Dict, List, Type
+
+import pytest
+from pydantic import BaseModel
+
+from parser.dataset.exam import Exam
+from parser.featurization.enrichment import (
+    Enricher,
+    EnrichmentStats,
+    Messages,
+    Prompt,
+    get_classification_messages,
+    get_naming_messages,
+)
+from parser.model import (
+    Metadata,
+    Question,
+    QuestionClassification,
+    QuestionDescription,
+    QuestionInputType,
+    QuestionNaming,
+    Section,
+    SectionType,
+    SubQuestion,
+    Text,
+)
+
+
+class FakeCompletion:
+    """
+    Stands in for the create function of instructor, answering from the prompt
+    without a model and counting the calls made with each user message.
+    """
+
+    def __init__(self, fail_on: str | None = None):
+        self.calls: Dict[str, int] = {}
+        # raise for the prompts whose user message contains this text
+        self.fail_on = fail_on
+        self.lock = threading.Lock()
+
+    def __call__(self, messages: Messages, response_model: Type[BaseModel]):
+        content = messages[-1]["content"]
+        with self.lock:
+            self.calls[content] = self.calls.get(content, 0) + 1
+        if self.fail_on is not None and self.fail_on in content:
+            raise RuntimeError("model unavailable")
+        if response_model is QuestionNaming:
+            return QuestionNaming(chain_of_thought=content, name=content)
+        if response_model is QuestionDescription:
+            return QuestionDescription(chain_of_thought=content, description=content)
+        assert response_model is QuestionClassification
+        return QuestionClassification(
+            chain_of_thought=content,
+            question_input_type=QuestionInputType.SHORT_ANSWER,
+        )
+
+    @property
+    def call_count(self) -> int:
+        return sum(self.calls.values())
+
+
+def get_naming_prompts(texts: List[str], names: List[str]) -> List[Prompt]:
+    return [
+        Prompt(
+            get_naming_messages(text),
+            QuestionNaming,
+            lambda response, index=index: names.__setitem__(index, response.name),
+        )
+        for index, text in enumerate(texts)
+    ]
+
+
+def make_exam() -> Exam:
+    sub_question = SubQuestion(
+        original_text=Text.from_string("a) What is the run time?", "", 0),
+        filtered_text=Text.from_string("What is the run time?", "", 3),
+        identifier="a",
+        sub_questions=[],
+        extracted_using_underscores=False,
+    )
+    questions = [
+        Question(
+            pages=[1],
+            section_type=SectionType.BASIC_DATA_STRUCTURES,
+            question_number=number,
+            max_points=10,
+            category="ALG",
+            sub_category="Stacks",
+            original_text=text,
+            filtered_text=text,
+            sub_questions=sub_questions,
+            metadata=Metadata(),
+        )
+        for number, text, sub_questions in [
+            (1, "Convert A + B to postfix.", []),
+            (2, "Consider the following function.", [sub_question]),
+        ]
+    ]
+    exam = Exam("exam.pdf")
+    exam.sections = [
+        Section(
+            start_page=1,
+            end_page=1,
+            type=SectionType.BASIC_DATA_STRUCTURES,
+            questions=questions,
+        )
+    ]
+    exam.semester = "Summer"
+    exam.year = 2021
+    exam.loaded = True
+    return exam
+
+
+def test_run_sends_identical_prompts_once():
+    create = FakeCompletion()
+    names = [""] * 3
+    stats = EnrichmentStats()
+    Enricher(create, "fake").run(
+        get_naming_prompts(["stack", "queue", "stack"], names), stats
+    )
+
+    assert create.call_count == 2
+    assert names[0] == names[2] != names[1]
+    assert stats == EnrichmentStats(
+        prompts=3, unique_prompts=2, cache_hits=0, model_calls=2
+    )
+
+
+def test_run_reads_responses_from_the_cache(tmp_path):
+    names = [""] * 2
+    Enricher(FakeCompletion(), "fake", cache_dir=str(tmp_path)).run(
+        get_naming_prompts(["stack", "queue"], names), EnrichmentStats()
+    )
+
+    create = FakeCompletion()
+    cached_names = [""] * 2
+    stats = EnrichmentStats()
+    Enricher(create, "fake", cache_dir=str(tmp_path)).run(
+        get_naming_prompts(["stack", "queue"], cached_names), stats
+    )
+
+    assert create.call_count == 0
+    assert cached_names == names
+    assert stats == EnrichmentStats(
+        prompts=2, unique_prompts=2, cache_hits=2, model_calls=0
+    )
+
+
+def test_get_key_is_stable_and_depends_on_the_model_and_schema():
+    prompt = Prompt(get_naming_messages("stack"), QuestionNaming, lambda _: None)
+    same_prompt = Prompt(get_naming_messages("stack"), QuestionNaming, print)
+    enricher = Enricher(FakeCompletion(), "fake")
+
+    assert enricher.get_key(prompt) == enricher.get_key(same_prompt)
+    assert enricher.get_key(prompt) == Enricher(FakeCompletion(), "fake").get_key(
+        prompt
+    )
+    assert enricher.get_key(prompt) != Enricher(FakeCompletion(), "other").get_key(
+        prompt
+    )
+    assert enricher.get_key(prompt) != enricher.get_key(
+        Prompt(prompt.messages, QuestionClassification, lambda _: None)
+    )
+    assert enricher.get_key(prompt) != enricher.get_key(
+        Prompt(get_classification_messages("stack"), QuestionNaming, lambda _: None)
+    )
+
+
+def test_rerun_after_a_failed_call_only_sends_the_failed_prompt(tmp_path):
+    failing = FakeCompletion(fail_on="queue")
+    with pytest.raises(RuntimeError):
+        Enricher(failing, "fake", cache_dir=str(tmp_path), max_workers=1).run(
+            get_naming_prompts(["stack", "queue"], [""] * 2), EnrichmentStats()
+        )
+
+    create = FakeCompletion()
+    names = [""] * 2
+    stats = EnrichmentStats()
+    Enricher(create, "fake", cache_dir=str(tmp_path)).run(
+        get_naming_prompts(["stack", "queue"], names), stats
+    )
+
+    assert list(create.calls) == [get_naming_messages("queue")[-1]["content"]]
+    assert all(name != "" for name in names)
+    assert stats.cache_hits == 1
+    assert stats.model_calls == 1
+
+
+def test_enrich_fills_questions_and_sub_questions():
+    exam = make_exam()
+    stats = Enricher(FakeCompletion(), "fake").enrich([exam])
+
+    assert exam.sections is not None
+    questions = exam.sections[0].questions
+    assert questions is not None
+    without_sub_questions, with_sub_questions = questions
+    assert without_sub_questions.metadata.generated_name is not None
+    assert without_sub_questions.metadata.classification is not None
+    assert without_sub_questions.metadata.description is not None
+    assert without_sub_questions.metadata.classification_on_description is not None
+    assert with_sub_questions.metadata.generated_name is not None
+    assert with_sub_questions.metadata.classification is None
+    assert with_sub_questions.sub_questions[0].classification is not None
+    # two names, a classification and a description, a sub-question classification,
+    # then the classification of the description
+    assert stats == EnrichmentStats(
+        prompts=6, unique_prompts=6, cache_hits=0, model_calls=6
+    )